@@ -0,0 +1,113 @@
+import argparse
+import json
+import os
+import sys
+from collections import defaultdict
+
+# Summarizes scan traces written with SCAN_TRACE_FILE (see scan_trace.py):
+# where the time went, which prefix subtrees were expensive for what they found,
+# and which queries recursed or failed.
+
+def load_spans(path):
+    # Oldest rotated file first: scan.jsonl.5 ... scan.jsonl.1, scan.jsonl
+    rotated = []
+    while os.path.exists(f"{path}.{len(rotated) + 1}"):
+        rotated.append(f"{path}.{len(rotated) + 1}")
+    rotated.reverse()
+    spans = []
+    for file_path in rotated + ([path] if os.path.exists(path) else []):
+        with open(file_path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    spans.append(json.loads(line))
+    return spans
+
+def summarize(spans, top=15):
+    queries = [s for s in spans if s.get('kind') == 'query']
+    phases = [s for s in spans if s.get('kind') == 'phase']
+    lines = []
+
+    if not queries:
+        return "No query spans found."
+
+    total_time = sum(s['duration'] for s in queries)
+    total_new = sum(s['new_users'] for s in queries)
+    total_wait = sum(s['sem_wait'] for s in queries)
+    errors = [s for s in queries if s.get('error')]
+    recursed = sum(1 for s in queries if s.get('recursed'))
+
+    lines.append(f"Queries: {len(queries)}  |  query time: {total_time:.1f}s  |  semaphore wait: {total_wait:.1f}s")
+    lines.append(f"New users: {total_new}  |  recursed: {recursed}  |  errors: {len(errors)}")
+    lines.append("")
+
+    lines.append("By depth:")
+    by_depth = defaultdict(lambda: [0, 0.0, 0, 0])
+    for s in queries:
+        d = by_depth[s['depth']]
+        d[0] += 1
+        d[1] += s['duration']
+        d[2] += s['results']
+        d[3] += s['new_users']
+    for depth in sorted(by_depth):
+        n, secs, results, new = by_depth[depth]
+        lines.append(f"  depth {depth}: {n} queries, {secs:.1f}s, {results} results, {new} new ({new / max(results, 1) * 100:.0f}% new)")
+    lines.append("")
+
+    lines.append("By phase:")
+    for s in phases:
+        lines.append(f"  phase {s['phase']} (channel {s['channel']}): {s['duration']:.1f}s, {s['queries']} queries, {s['new_users']} new")
+    if not phases:
+        lines.append("  (no completed phases)")
+    lines.append("")
+
+    # Subtree cost: everything under a top-level prefix
+    subtrees = defaultdict(lambda: [0, 0.0, 0])
+    for s in queries:
+        root = s['prefix'][:1]
+        t = subtrees[root]
+        t[0] += 1
+        t[1] += s['duration']
+        t[2] += s['new_users']
+    lines.append(f"Most expensive subtrees (top {top}):")
+    for root, (n, secs, new) in sorted(subtrees.items(), key=lambda kv: -kv[1][1])[:top]:
+        lines.append(f"  '{root}': {secs:.1f}s over {n} queries, {new} new, {new / max(n, 1):.1f} new/query")
+    lines.append("")
+
+    lines.append(f"Lowest-yield subtrees (queries per new user, top {top}):")
+    ranked = sorted(((n / max(new, 1), root, n, new) for root, (n, _, new) in subtrees.items() if n > 1), reverse=True)
+    for ratio, root, n, new in ranked[:top]:
+        lines.append(f"  '{root}': {n} queries for {new} new users")
+    lines.append("")
+
+    lines.append(f"Slowest queries (top {top}):")
+    for s in sorted(queries, key=lambda s: -s['duration'])[:top]:
+        flag = f"  ⚠️ {s['error']}" if s.get('error') else ""
+        lines.append(f"  '{s['prefix']}' d{s['depth']} p{s['phase']}: {s['duration']:.2f}s, {s['results']} results, {s['new_users']} new, wait {s['sem_wait']:.2f}s{flag}")
+
+    if errors:
+        lines.append("")
+        lines.append("Errors:")
+        by_error = defaultdict(int)
+        for s in errors:
+            by_error[s['error'].split(' ')[0]] += 1
+        for err, n in sorted(by_error.items(), key=lambda kv: -kv[1]):
+            lines.append(f"  {err}: {n}")
+
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize scan trace JSONL files.")
+    parser.add_argument("trace", help="Trace file (SCAN_TRACE_FILE); rotated .1, .2 ... files are included")
+    parser.add_argument("--channel", type=int, help="Only spans for this channel ID")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args(argv)
+
+    spans = load_spans(args.trace)
+    if args.channel is not None:
+        spans = [s for s in spans if s.get('channel') == args.channel]
+    print(summarize(spans, args.top))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+from fake_telegram import FakeTelegramClient, NAME_DISTRIBUTIONS
+from export_members import open_db, export_channel, peak_rss_mb
+from scan_replay import ReplayClient
+
+# Benchmarks recursive_scan_task, save_members_batch and the exporters against
+# FakeTelegramClient. Runs in a scratch directory so no real session or DB is touched.
+
+def import_bot(workdir):
+    # bot.py needs credentials at import time and loads *.session from the CWD
+    os.environ.setdefault("API_ID", "1")
+    os.environ.setdefault("API_HASH", "bench")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(workdir)
+    with contextlib.redirect_stdout(io.StringIO()):
+        import bot
+    bot.DB_FILE = os.path.join(workdir, "members.db")
+    bot.init_db()
+    return bot
+
+def instrument_db_writes(bot, stats):
+    """Wraps save_members_batch to measure DB write throughput."""
+    original = bot.save_members_batch
+
+    def timed_save(users_data, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return original(users_data, *args, **kwargs)
+        finally:
+            stats['db_seconds'] += time.perf_counter() - started
+            stats['db_rows'] += len(users_data)
+            stats['db_batches'] += 1
+
+    bot.save_members_batch = timed_save
+
+def run_case(bot, stats, fake, size, names, mode, args):
+    entity = fake.channel
+    bot.save_channel_pref(entity.id, mode)
+    stats.update({'db_seconds': 0.0, 'db_rows': 0, 'db_batches': 0})
+
+    log = io.StringIO()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(log if not args.verbose else sys.stdout):
+        asyncio.run(bot.recursive_scan_task(entity, scan_client=fake))
+    elapsed = time.perf_counter() - started
+
+    conn = open_db(bot.DB_FILE)
+    try:
+        found = conn.execute("SELECT COUNT(*) FROM members WHERE channel_id = ?", (entity.id,)).fetchone()[0]
+        export_started = time.perf_counter()
+        export_dir = tempfile.mkdtemp(prefix="exports_", dir=os.path.dirname(bot.DB_FILE))
+        export_channel(conn, entity.id, entity.title, 'long', ['csv', 'txt'], export_dir)
+        export_seconds = time.perf_counter() - export_started
+    finally:
+        conn.close()
+
+    served = fake.users_served
+    result = {
+        'size': size,
+        'names': names,
+        'mode': mode,
+        'seconds': round(elapsed, 3),
+        'requests': fake.requests,
+        'search_requests': fake.search_requests,
+        'flood_waits': fake.flood_waits,
+        'found': found,
+        'coverage_pct': round(found / size * 100, 2),
+        'members_per_sec': round(found / elapsed, 1) if elapsed else 0,
+        'duplicate_rate_pct': round((served - found) / served * 100, 2) if served else 0.0,
+        'db_rows_per_sec': round(stats['db_rows'] / stats['db_seconds'], 1) if stats['db_seconds'] else 0,
+        'db_batches': stats['db_batches'],
+        'export_seconds': round(export_seconds, 3),
+        'peak_rss_mb': round(peak_rss_mb() or 0, 1),
+    }
+    if isinstance(fake, ReplayClient):
+        result['recorded_users'] = fake.recorded_users
+        result['unrecorded_queries'] = len(fake.missing_queries)
+    return result
+
+def print_table(results):
+    cols = ['size', 'names', 'mode', 'seconds', 'requests', 'found', 'coverage_pct', 'members_per_sec',
+            'duplicate_rate_pct', 'db_rows_per_sec', 'export_seconds', 'peak_rss_mb']
+    widths = [max(len(c), *(len(str(r[c])) for r in results)) for c in cols]
+    print("  ".join(c.ljust(w) for c, w in zip(cols, widths)))
+    for r in results:
+        print("  ".join(str(r[c]).ljust(w) for c, w in zip(cols, widths)))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark channel scans against a fake Telegram backend.")
+    parser.add_argument("--sizes", default="10000,100000", help="Comma-separated channel sizes (10k to 5M)")
+    parser.add_argument("--names", default="mixed", help=f"Comma-separated name distributions: {', '.join(NAME_DISTRIBUTIONS)}")
+    parser.add_argument("--mode", default="all", choices=['all', 'smart_tiered', 'recent', 'week'])
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds per request")
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="Probability of FloodWait per request")
+    parser.add_argument("--flood-seconds", type=int, default=0)
+    parser.add_argument("--search-limit", type=int, default=200)
+    parser.add_argument("--list-limit", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--replay", action="append", default=[],
+                        help="Replay a recorded fixture (SCAN_RECORD_DIR/<id>.jsonl.gz) instead of synthetic data; repeatable")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON lines")
+    parser.add_argument("--verbose", action="store_true", help="Show the bot's scan log")
+    args = parser.parse_args(argv)
+
+    # import_bot() changes directory, so resolve fixture paths first
+    replay_paths = [os.path.abspath(path) for path in args.replay]
+    workdir = tempfile.mkdtemp(prefix="bench_scan_")
+    bot = import_bot(workdir)
+    stats = {}
+    instrument_db_writes(bot, stats)
+
+    cases = []
+    if args.replay:
+        for path in replay_paths:
+            replay = ReplayClient(path, latency=args.latency)
+            cases.append((replay, replay.participants_count, 'replay'))
+    else:
+        for names in args.names.split(","):
+            for size in args.sizes.split(","):
+                # Fresh channel ID per case so DB contents and checkpoints don't carry over
+                fake = FakeTelegramClient(size=int(size), names=names.strip(), latency=args.latency,
+                                          flood_rate=args.flood_rate, flood_seconds=args.flood_seconds,
+                                          search_limit=args.search_limit, list_limit=args.list_limit,
+                                          seed=args.seed, channel_id=1000001 + len(cases))
+                cases.append((fake, int(size), names.strip()))
+
+    results = []
+    for fake, size, names in cases:
+        result = run_case(bot, stats, fake, size, names, args.mode, args)
+        results.append(result)
+        if args.json:
+            print(json.dumps(result))
+
+    if not args.json:
+        print_table(results)
+    print(f"Scratch dir: {workdir}", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
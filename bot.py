@@ -1,19 +1,53 @@
+import time
+_startup_t0 = time.perf_counter()
+
 import asyncio
 import sys
-import time
 import string
 import os
 import sqlite3
-import pandas as pd
 import glob
+import json
+import shutil
+import functools
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import signal
+import socket
 import random
 import socks
 from telethon import TelegramClient, events
 from telethon.errors import ChatAdminRequiredError, ChannelPrivateError, RPCError, FloodWaitError
-from telethon.tl.types import Channel, Chat, UserStatusOnline, UserStatusOffline, UserStatusRecently, UserStatusLastWeek, UserStatusLastMonth, UserStatusEmpty
+from telethon import utils, helpers, functions
+from telethon.tl.types import InputFileBig
+from telethon.tl.types import Channel, ChannelForbidden, Chat, PeerChannel, UpdateChannel, UserStatusOnline, UserStatusOffline, UserStatusRecently, UserStatusLastWeek, UserStatusLastMonth, UserStatusEmpty
 import argparse
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 from dotenv import load_dotenv
+from export_members import (
+    export_channel_files, export_tier_txt, split_file, format_report, get_watermark, set_watermark,
+    open_db as open_export_db, resolve_channel as resolve_export_channel, write_scan_diff, format_scan_diff,
+    FILTER_STATUSES, STATUS_LABELS, FilterError, table_exists,
+)
+import metrics
+import member_search
+import channel_overlap
+import channel_stats
+import status_history
+from scan_trace import tracer_from_env
+from scan_registry import ScanRegistry, RequestBudget, format_job
+from loop_watchdog import LoopWatchdog, profile_loop
+
+# pandas (and numpy) / openpyxl are imported on first use, not here: every restart
+# would otherwise pay for them before a single session connects.
+
+# Startup phase durations (seconds), printed once the bot is up
+startup_timings = {'import': time.perf_counter() - _startup_t0}
+
+def print_startup_report():
+    total = time.perf_counter() - _startup_t0
+    parts = " | ".join(f"{name} {secs:.2f}s" for name, secs in startup_timings.items())
+    print(f"⏱ Startup: {parts} | total {total:.2f}s")
 
 # Load environment variables
 load_dotenv()
@@ -27,13 +61,111 @@ if not api_id or not api_hash:
 
 session_name = "session"
 
+# Optional: record every participant query to <dir>/<channel_id>.jsonl.gz (see scan_replay.py)
+SCAN_RECORD_DIR = os.getenv("SCAN_RECORD_DIR")
+
+# Extra user IDs allowed to run admin-only commands like /stats (comma-separated).
+# The accounts behind our own sessions are always allowed.
+ADMIN_IDS = {int(x) for x in os.getenv("ADMIN_IDS", "").replace(" ", "").split(",") if x}
+session_user_ids = set()
+
+# Optional localhost Prometheus endpoint (GET /metrics); disabled when unset
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Optional per-query scan tracing to a rotating JSONL file (SCAN_TRACE_FILE, see analyze_trace.py)
+scan_tracer = tracer_from_env()
+
+# Opt-in loop watchdog: logs the stack of any callback blocking the loop longer than the threshold
+LOOP_WATCHDOG = os.getenv("LOOP_WATCHDOG", "").lower() in ("1", "true", "yes")
+LOOP_BLOCK_THRESHOLD_MS = int(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "250"))
+
+# Per-session budget for connect + authorization check at startup (seconds)
+SESSION_CONNECT_TIMEOUT = float(os.getenv("SESSION_CONNECT_TIMEOUT", "30"))
+
+# Only load these sessions (comma-separated names, e.g. BOT_SESSIONS=worker1,worker2).
+# A session file can only be open in one process, so each process gets its own set.
+BOT_SESSIONS = [x for x in os.getenv("BOT_SESSIONS", "").replace(" ", "").split(",") if x]
+
+# Multi-process layout: with SCAN_QUEUE=1 the command process only enqueues scans in
+# the scan_queue table; `python bot.py --scan-worker` processes claim and run them
+# and write their progress back to the same row.
+SCAN_QUEUE = os.getenv("SCAN_QUEUE", "").lower() in ("1", "true", "yes")
+SCAN_QUEUE_POLL_INTERVAL = float(os.getenv("SCAN_QUEUE_POLL_INTERVAL", "3"))
+SCAN_JOB_STALE_SECONDS = int(os.getenv("SCAN_JOB_STALE_SECONDS", "600"))
+# Claimed jobs are touched this often (well inside the stale window) for as long as they run
+SCAN_JOB_HEARTBEAT_SECONDS = max(SCAN_JOB_STALE_SECONDS // 4, 1)
+
+# Concurrent participant requests shared by all scans in this process (see scan_registry.py)
+SCAN_REQUEST_BUDGET = int(os.getenv("SCAN_REQUEST_BUDGET", "10"))
+
+# Idle refresh: monitored channels are rescanned every REFRESH_INTERVAL_HOURS (0 = off),
+# stalest first. A refresh starts only while no scan is running and no admin command was
+# seen for REFRESH_ADMIN_QUIET_SECONDS; it runs below every other scan in the request
+# budget and is paused while admins are active.
+REFRESH_INTERVAL_HOURS = float(os.getenv("REFRESH_INTERVAL_HOURS", "24"))
+REFRESH_CHECK_INTERVAL = int(os.getenv("REFRESH_CHECK_INTERVAL", "60"))
+REFRESH_ADMIN_QUIET_SECONDS = int(os.getenv("REFRESH_ADMIN_QUIET_SECONDS", "120"))
+REFRESH_PRIORITY = -10
+
 # Database Setup
 DB_FILE = "members.db"
 
-# Async Helper
-async def run_in_executor(func, *args):
+# Participants are classified and saved a page at a time (Telethon fetches 200 per request)
+PARTICIPANT_PAGE_SIZE = 200
+
+# Export uploads: files over UPLOAD_PART_MAX_MB are split at line ends (Telegram takes at
+# most 2000 MB per file from user accounts), and files over 10 MB are uploaded as
+# UPLOAD_CONCURRENCY parallel 512 KB chunks instead of one chunk at a time.
+UPLOAD_PART_MAX_MB = float(os.getenv("UPLOAD_PART_MAX_MB", "1900"))
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "8"))
+UPLOAD_CHUNK_SIZE = 512 * 1024
+
+# With EXPORT_PREGENERATE=1, a finished scan builds every tier's export files into
+# EXPORT_CACHE_DIR in the background; /filter_batch and /filter_<mode> send them
+# directly while the channel's data is unchanged since.
+EXPORT_PREGENERATE = os.getenv("EXPORT_PREGENERATE", "").lower() in ("1", "true", "yes")
+EXPORT_CACHE_DIR = os.getenv("EXPORT_CACHE_DIR", "export_cache")
+EXPORT_MODES = ['recently', 'week', 'month', 'long']
+# Pre-generation waits up to this many seconds for member writes to settle (live joins keep writing)
+PREGENERATE_SETTLE_TRIES = 5
+
+# Executors: short DB reads and long exports get separate bounded pools, so a big
+# /filter_batch can't take every worker and starve the scan preload. Exports can
+# optionally run in a process pool to keep formatting off the event loop's GIL.
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "4"))
+EXPORT_EXECUTOR_WORKERS = int(os.getenv("EXPORT_EXECUTOR_WORKERS", "2"))
+EXPORT_PROCESS_POOL = os.getenv("EXPORT_PROCESS_POOL", "").lower() in ("1", "true", "yes")
+
+db_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db")
+if EXPORT_PROCESS_POOL:
+    # Not fork: forking a process with running threads (executors, Telethon) can copy held
+    # locks. The forkserver imports this file once as __mp_main__, which skips the client
+    # setup below; workers are forked from that clean single-threaded process.
+    start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    export_executor = ProcessPoolExecutor(max_workers=EXPORT_EXECUTOR_WORKERS, mp_context=multiprocessing.get_context(start_method))
+else:
+    export_executor = ThreadPoolExecutor(max_workers=EXPORT_EXECUTOR_WORKERS, thread_name_prefix="export")
+
+def _timed_call(pool_name, submitted, func, *args):
+    # Runs in the worker thread: queue wait ends when the call starts
+    metrics.EXECUTOR_WAIT_SECONDS.observe(time.perf_counter() - submitted, pool=pool_name)
+    return func(*args)
+
+async def run_in_pool(executor, pool_name, func, *args):
     loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(None, func, *args)
+    metrics.EXECUTOR_INFLIGHT.inc(pool=pool_name)
+    try:
+        if isinstance(executor, ThreadPoolExecutor):
+            return await loop.run_in_executor(executor, _timed_call, pool_name, time.perf_counter(), func, *args)
+        waited, result = await loop.run_in_executor(executor, metrics.timed_process_call, time.time(), func, *args)
+        metrics.EXECUTOR_WAIT_SECONDS.observe(max(waited, 0.0), pool=pool_name)
+        return result
+    finally:
+        metrics.EXECUTOR_INFLIGHT.dec(pool=pool_name)
+
+# Async Helper: short DB reads
+async def run_in_executor(func, *args):
+    return await run_in_pool(db_executor, 'db', func, *args)
 
 def init_db():
     conn = sqlite3.connect(DB_FILE)
@@ -50,6 +182,14 @@ def init_db():
             is_bot INTEGER,
             channel_id INTEGER,
             status TEXT,
+            left_at INTEGER,
+            first_seen INTEGER,
+            updated_at INTEGER,
+            last_seen_gen INTEGER,
+            prev_seen_gen INTEGER,
+            prev_status TEXT,
+            last_online INTEGER,
+            joined_at INTEGER,
             PRIMARY KEY (id, channel_id)
         )
     ''')
@@ -68,6 +208,38 @@ def init_db():
     except sqlite3.OperationalError:
         print("Migrating DB: Adding 'status' column...")
         c.execute("ALTER TABLE members ADD COLUMN status TEXT")
+
+    # Migration: 'left_at' marks members seen leaving/kicked (NULL = still a member)
+    try:
+        c.execute("SELECT left_at FROM members LIMIT 1")
+    except sqlite3.OperationalError:
+        print("Migrating DB: Adding 'left_at' column...")
+        c.execute("ALTER TABLE members ADD COLUMN left_at INTEGER")
+
+    # Migration: first_seen / updated_at drive delta exports (NULL on rows saved before this)
+    try:
+        c.execute("SELECT first_seen, updated_at FROM members LIMIT 1")
+    except sqlite3.OperationalError:
+        print("Migrating DB: Adding 'first_seen' and 'updated_at' columns...")
+        c.execute("ALTER TABLE members ADD COLUMN first_seen INTEGER")
+        c.execute("ALTER TABLE members ADD COLUMN updated_at INTEGER")
+
+    # Migration: scan generation tags (which scan last saw the member, the one before, and its status then)
+    try:
+        c.execute("SELECT last_seen_gen, prev_seen_gen, prev_status FROM members LIMIT 1")
+    except sqlite3.OperationalError:
+        print("Migrating DB: Adding scan generation columns...")
+        c.execute("ALTER TABLE members ADD COLUMN last_seen_gen INTEGER")
+        c.execute("ALTER TABLE members ADD COLUMN prev_seen_gen INTEGER")
+        c.execute("ALTER TABLE members ADD COLUMN prev_status TEXT")
+
+    # Migration: exact last-seen time (when not hidden) and join date, for /filter seen:/joined:
+    try:
+        c.execute("SELECT last_online, joined_at FROM members LIMIT 1")
+    except sqlite3.OperationalError:
+        print("Migrating DB: Adding 'last_online' and 'joined_at' columns...")
+        c.execute("ALTER TABLE members ADD COLUMN last_online INTEGER")
+        c.execute("ALTER TABLE members ADD COLUMN joined_at INTEGER")
     
     # Checkpoints table for resume capability
     c.execute('''
@@ -92,7 +264,98 @@ def init_db():
             scan_mode TEXT
         )
     ''')
+
+    # Channel metadata so offline tools (export_members.py) can select by title/username
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS channels (
+            id INTEGER PRIMARY KEY,
+            title TEXT,
+            username TEXT,
+            participants_count INTEGER,
+            updated_at INTEGER
+        )
+    ''')
+
+    # Scan jobs shared between the command process and --scan-worker processes
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS scan_queue (
+            channel_id INTEGER PRIMARY KEY,
+            title TEXT,
+            status TEXT,
+            worker TEXT,
+            found INTEGER DEFAULT 0,
+            total INTEGER,
+            progress TEXT,
+            error TEXT,
+            requested_at INTEGER,
+            updated_at INTEGER
+        )
+    ''')
+
+    # One row per recursive_scan_task run; an interrupted run is resumed under the same generation
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS scan_generations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            channel_id INTEGER,
+            scan_mode TEXT,
+            status TEXT,
+            started_at INTEGER,
+            finished_at INTEGER,
+            members_seen INTEGER
+        )
+    ''')
+
+    # Last delta export per (consumer, channel, mode); consumer is the chat ID or a CLI name
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS export_watermarks (
+            consumer TEXT,
+            channel_id INTEGER,
+            mode TEXT,
+            exported_at INTEGER,
+            PRIMARY KEY (consumer, channel_id, mode)
+        )
+    ''')
+
+    # Pre-generated tier exports (EXPORT_PREGENERATE); version is the channel's MAX(updated_at) they were built from
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS export_artifacts (
+            channel_id INTEGER,
+            mode TEXT,
+            version INTEGER,
+            out_dir TEXT,
+            paths TEXT,
+            count INTEGER,
+            u_count INTEGER,
+            i_count INTEGER,
+            generated_at INTEGER,
+            PRIMARY KEY (channel_id, mode)
+        )
+    ''')
+
+    # Tier filters and per-channel exports all select by channel_id first
+    c.execute("CREATE INDEX IF NOT EXISTS idx_members_channel_status ON members (channel_id, status)")
+    # Delta exports: range scan over recently changed rows
+    c.execute("CREATE INDEX IF NOT EXISTS idx_members_channel_updated ON members (channel_id, updated_at)")
+    # Scan diffs: joined/left/changed are range lookups on the generation tags
+    c.execute("CREATE INDEX IF NOT EXISTS idx_members_channel_gen ON members (channel_id, last_seen_gen)")
+    # /filter seen:<N>d range predicate
+    c.execute("CREATE INDEX IF NOT EXISTS idx_members_channel_last_online ON members (channel_id, last_online)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_scan_generations_channel ON scan_generations (channel_id, status)")
         
+    conn.commit()
+
+    # Full-text name search for /find (backfilled once from existing rows)
+    indexed = member_search.ensure_index(conn)
+    if indexed:
+        print(f"Built search index for {indexed} members.")
+    # Channel overlap matrix for /overlap (built once, then maintained by member writes)
+    if channel_overlap.ensure_table(conn):
+        print("Built channel overlap cache.")
+    # Per-channel tier counts for the dashboard and /summary
+    if channel_stats.ensure_table(conn):
+        print("Built channel stats.")
+    # Run-length status history (filled from now on by scans and join events)
+    status_history.ensure_table(conn)
     conn.commit()
     conn.close()
 
@@ -103,6 +366,16 @@ def save_channel_pref(channel_id, mode):
     conn.commit()
     conn.close()
 
+def save_channel_info(entity, participants_count=None):
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    c.execute('''
+        INSERT OR REPLACE INTO channels (id, title, username, participants_count, updated_at)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (entity.id, getattr(entity, 'title', None), getattr(entity, 'username', None), participants_count, int(time.time())))
+    conn.commit()
+    conn.close()
+
 def get_channel_pref(channel_id):
     conn = sqlite3.connect(DB_FILE)
     c = conn.cursor()
@@ -111,6 +384,32 @@ def get_channel_pref(channel_id):
     conn.close()
     return row[0] if row else None
 
+def get_channel_stats(channel_id):
+    conn = sqlite3.connect(DB_FILE)
+    try:
+        return channel_stats.get_stats(conn, channel_id)
+    finally:
+        conn.close()
+
+def format_tier_counts(stats, detailed=False):
+    """Tier counts from channel_stats; the cumulative tiers match what /filter_* exports."""
+    total = stats['total'] or 0
+    pct = lambda n: f"{n / total * 100:.1f}%" if total else "0%"
+    recently = stats['online'] + stats['today'] + stats['recently']
+    week = recently + stats['week']
+    month = week + stats['month']
+    lines = [
+        f"👥 Members: **{total}**",
+        f"🟢 Recently: {recently} ({pct(recently)}) | 🗓 Week: {week} ({pct(week)}) | 📆 Month: {month} ({pct(month)})",
+    ]
+    if detailed:
+        lines.append("")
+        for label in STATUS_LABELS:
+            lines.append(f"• {label}: {stats[label]} ({pct(stats[label])})")
+        lines.append("")
+    lines.append(f"👤 With username: {stats['with_username']} ({pct(stats['with_username'])}) | 🤖 Bots: {stats['bots']}")
+    return "\n".join(lines)
+
 def save_checkpoint(channel_id, index, phase=1):
     conn = sqlite3.connect(DB_FILE)
     c = conn.cursor()
@@ -128,6 +427,66 @@ def get_checkpoint(channel_id):
         return row[0], row[1] if len(row) > 1 else 1
     return 0, 1
 
+def start_scan_generation(channel_id, scan_mode):
+    """
+    Returns the channel's unfinished generation or starts a new one. A failed or cancelled
+    last generation is resumed too (set back to running), like the scan checkpoint is.
+    """
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    c.execute("SELECT id, status FROM scan_generations WHERE channel_id = ? ORDER BY id DESC LIMIT 1", (channel_id,))
+    row = c.fetchone()
+    if row and row[1] != 'complete':
+        gen = row[0]
+        if row[1] != 'running':
+            c.execute("UPDATE scan_generations SET status = 'running', finished_at = NULL WHERE id = ?", (gen,))
+            conn.commit()
+    else:
+        c.execute(
+            "INSERT INTO scan_generations (channel_id, scan_mode, status, started_at) VALUES (?, ?, 'running', ?)",
+            (channel_id, scan_mode, int(time.time()))
+        )
+        gen = c.lastrowid
+        conn.commit()
+    conn.close()
+    return gen
+
+def finish_scan_generation(gen):
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    c.execute('''
+        UPDATE scan_generations SET status = 'complete', finished_at = ?,
+            members_seen = (SELECT COUNT(*) FROM members WHERE channel_id = scan_generations.channel_id AND last_seen_gen = scan_generations.id)
+        WHERE id = ?
+    ''', (int(time.time()), gen))
+    conn.commit()
+    conn.close()
+
+def abort_scan_generation(gen, status):
+    """Marks a generation 'failed' or 'cancelled', so it isn't shown as a scan in progress."""
+    conn = sqlite3.connect(DB_FILE)
+    conn.execute("UPDATE scan_generations SET status = ?, finished_at = ? WHERE id = ?", (status, int(time.time()), gen))
+    conn.commit()
+    conn.close()
+
+def get_refresh_order(channel_ids, interval_seconds):
+    """
+    Channels of channel_ids due for a refresh, most overdue first (in whole intervals since
+    their last complete scan; never completed counts as oldest), then smallest first.
+    """
+    conn = sqlite3.connect(DB_FILE)
+    try:
+        last_complete = dict(conn.execute(
+            "SELECT channel_id, MAX(finished_at) FROM scan_generations WHERE status = 'complete' GROUP BY channel_id"
+        ))
+        sizes = dict(conn.execute("SELECT channel_id, total FROM channel_stats"))
+    finally:
+        conn.close()
+    now = time.time()
+    age = {cid: now - (last_complete.get(cid) or 0) for cid in channel_ids}
+    due = [cid for cid in channel_ids if age[cid] >= interval_seconds]
+    return sorted(due, key=lambda cid: (-(age[cid] // interval_seconds), sizes.get(cid) or 0))
+
 def set_setting(key, value):
     conn = sqlite3.connect(DB_FILE)
     c = conn.cursor()
@@ -143,6 +502,91 @@ def get_setting(key):
     conn.close()
     return row[0] if row else None
 
+def enqueue_scan(channel_id, title):
+    """Queues a scan unless one is already queued or running for the channel."""
+    now = int(time.time())
+    conn = sqlite3.connect(DB_FILE, timeout=30)
+    c = conn.cursor()
+    c.execute('''
+        INSERT INTO scan_queue (channel_id, title, status, found, requested_at, updated_at)
+        VALUES (?, ?, 'queued', 0, ?, ?)
+        ON CONFLICT(channel_id) DO UPDATE SET
+            title = excluded.title, status = 'queued', worker = NULL, error = NULL,
+            progress = NULL, requested_at = excluded.requested_at, updated_at = excluded.updated_at
+        WHERE status NOT IN ('queued', 'running')
+    ''', (channel_id, title, now, now))
+    conn.commit()
+    conn.close()
+
+def claim_scan(worker, channel_ids):
+    """
+    Atomically claims the oldest queued job for one of channel_ids (channels this
+    worker's session can see). Jobs whose worker stopped updating are reclaimed.
+    Returns (channel_id, title) or None.
+    """
+    now = int(time.time())
+    conn = sqlite3.connect(DB_FILE, timeout=30, isolation_level=None)
+    try:
+        # IMMEDIATE takes the write lock up front so two workers can't claim the same row
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute('''
+            SELECT channel_id, title FROM scan_queue
+            WHERE status = 'queued' OR (status = 'running' AND updated_at < ?)
+            ORDER BY requested_at
+        ''', (now - SCAN_JOB_STALE_SECONDS,)).fetchall()
+        job = next((row for row in rows if row[0] in channel_ids), None)
+        if job:
+            conn.execute(
+                "UPDATE scan_queue SET status = 'running', worker = ?, updated_at = ? WHERE channel_id = ?",
+                (worker, now, job[0])
+            )
+        conn.execute("COMMIT")
+        return job
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+def update_scan_job(channel_id, worker, status=None, found=None, total=None, progress=None, error=None):
+    """Progress/heartbeat from a scan worker; ignored if another worker took the job over."""
+    conn = sqlite3.connect(DB_FILE, timeout=30)
+    c = conn.cursor()
+    c.execute('''
+        UPDATE scan_queue SET status = COALESCE(?, status), found = COALESCE(?, found), total = COALESCE(?, total),
+            progress = COALESCE(?, progress), error = ?, updated_at = ?
+        WHERE channel_id = ? AND worker = ?
+    ''', (status, found, total, progress, error, int(time.time()), channel_id, worker))
+    conn.commit()
+    conn.close()
+
+def touch_scan_job(channel_id, worker):
+    """Heartbeat: only bumps updated_at, and only while the worker's job is still running."""
+    conn = sqlite3.connect(DB_FILE, timeout=30)
+    conn.execute(
+        "UPDATE scan_queue SET updated_at = ? WHERE channel_id = ? AND worker = ? AND status = 'running'",
+        (int(time.time()), channel_id, worker)
+    )
+    conn.commit()
+    conn.close()
+
+def list_scan_jobs():
+    conn = sqlite3.connect(DB_FILE, timeout=30)
+    c = conn.cursor()
+    c.execute('SELECT channel_id, title, status, worker, found, total, progress, error, updated_at FROM scan_queue')
+    rows = c.fetchall()
+    conn.close()
+    return rows
+
+def session_label(c):
+    """Session file name used to identify a client in logs and metrics."""
+    try: return os.path.basename(c.session.filename)
+    except: return "unknown"
+
+def is_bot_admin(event):
+    """Admin-only commands: our own accounts (incl. outgoing messages) and ADMIN_IDS."""
+    return event.out or event.sender_id in session_user_ids or event.sender_id in ADMIN_IDS
+
 async def resolve_entity(event, link_or_id=None):
     """Helper to resolve entity from link, current chat, or saved selection."""
     # Use client from event if available, otherwise fallback to global client
@@ -233,91 +677,162 @@ async def check_can_ban(entity, client_instance=None):
     except:
         return False
 
-def get_user_status_label(user):
-    """Classifies user status into: online, today, week, month, long."""
-    # Debug: Print user status type for first few users to verify
-    # print(f"DEBUG: User {user.id} status type: {type(user.status)}")
-    
-    if isinstance(user.status, UserStatusOnline):
-        return 'online'
-    
-    if isinstance(user.status, UserStatusOffline):
-        was_online = user.status.was_online
-        # Ensure timezone awareness (Telethon uses UTC usually)
-        if was_online.tzinfo is None:
-            was_online = was_online.replace(tzinfo=timezone.utc)
-        
-        now = datetime.now(timezone.utc)
-        diff = now - was_online
-        
-        if diff < timedelta(days=1):
-            return 'today'
-        elif diff < timedelta(days=7):
-            return 'week'
-        elif diff < timedelta(days=30):
-            return 'month'
+# Status types whose label doesn't depend on the clock
+STATUS_TYPE_LABELS = {
+    UserStatusOnline: 'online',
+    # "Last seen recently" (within ~3 days) with the exact time hidden
+    UserStatusRecently: 'recently',
+    UserStatusLastWeek: 'week',
+    UserStatusLastMonth: 'month',
+    UserStatusEmpty: 'long',
+}
+
+def classify_users(users, now=None):
+    """
+    Returns [(status_label, last_online)] for a page of users in one pass, reading the clock once.
+    Labels: online, today, recently, week, month, long. last_online is the exact last-seen
+    unix time when Telegram exposes it, else None.
+    """
+    now = now or time.time()
+    result = []
+    for user in users:
+        status = user.status
+        label = STATUS_TYPE_LABELS.get(type(status))
+        if label == 'online':
+            result.append(('online', int(now)))
+        elif label:
+            result.append((label, None))
+        elif isinstance(status, UserStatusOffline) and status.was_online:
+            was_online = status.was_online
+            # Ensure timezone awareness (Telethon uses UTC usually)
+            if was_online.tzinfo is None:
+                was_online = was_online.replace(tzinfo=timezone.utc)
+            seen = was_online.timestamp()
+            diff = now - seen
+            if diff < 86400:
+                label = 'today'
+            elif diff < 7 * 86400:
+                label = 'week'
+            elif diff < 30 * 86400:
+                label = 'month'
+            else:
+                label = 'long'
+            result.append((label, int(seen)))
         else:
-            return 'long'
-            
-    if isinstance(user.status, UserStatusRecently):
-        # UserStatusRecently means "Last seen recently" (within ~3 days) but hidden exact time
-        # This is effectively "online" or "today" for many intents, but strictly it is 'recently'.
-        # However, to capture them in "Phase 1: Online & Recent", we map them to 'recently'.
-        return 'recently' 
-        
-    if isinstance(user.status, UserStatusLastWeek):
-        return 'week'
-    if isinstance(user.status, UserStatusLastMonth):
-        return 'month'
-    if isinstance(user.status, UserStatusEmpty):
-        return 'long'
-        
-    return 'long' # Default
+            result.append(('long', None))  # Default
+    return result
+
+def get_user_status_label(user):
+    """Classifies user status into: online, today, recently, week, month, long."""
+    return classify_users([user])[0][0]
+
+# Upsert that keeps first_seen and only bumps updated_at when something actually changed,
+# so delta exports don't resend every member a rescan touches. When saved by a scan
+# (last_seen_gen set), the previous generation and status are kept for scan diffs.
+UPSERT_MEMBER_SQL = '''
+    INSERT INTO members (id, username, first_name, last_name, phone, is_bot, channel_id, status, first_seen, updated_at,
+                         last_seen_gen, last_online, joined_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id, channel_id) DO UPDATE SET
+        username = excluded.username, first_name = excluded.first_name, last_name = excluded.last_name,
+        phone = excluded.phone, is_bot = excluded.is_bot, status = excluded.status, left_at = NULL,
+        last_online = excluded.last_online, joined_at = COALESCE(excluded.joined_at, members.joined_at),
+        updated_at = CASE WHEN members.username IS NOT excluded.username
+                            OR members.first_name IS NOT excluded.first_name
+                            OR members.last_name IS NOT excluded.last_name
+                            OR members.phone IS NOT excluded.phone
+                            OR members.status IS NOT excluded.status
+                            OR members.left_at IS NOT NULL
+                       THEN excluded.updated_at ELSE members.updated_at END,
+        prev_status = CASE WHEN excluded.last_seen_gen IS NOT NULL AND members.last_seen_gen IS NOT excluded.last_seen_gen
+                           THEN members.status ELSE members.prev_status END,
+        prev_seen_gen = CASE WHEN excluded.last_seen_gen IS NOT NULL AND members.last_seen_gen IS NOT excluded.last_seen_gen
+                             THEN members.last_seen_gen ELSE members.prev_seen_gen END,
+        last_seen_gen = COALESCE(excluded.last_seen_gen, members.last_seen_gen)
+'''
+
+def member_row(user, channel_id, now, scan_gen=None, status=None):
+    """Parameters for UPSERT_MEMBER_SQL. status: (label, last_online) from classify_users(), if already known."""
+    label, last_online = status or classify_users([user], now)[0]
+    # iter_participants attaches the participant record; its date is the join date
+    participant = getattr(user, 'participant', None)
+    joined = getattr(participant, 'date', None)
+    return (
+        user.id, user.username or "", user.first_name or "", user.last_name or "",
+        user.phone or "", 1 if user.bot else 0, channel_id, label, now, now,
+        scan_gen, last_online, int(joined.timestamp()) if joined else None
+    )
+
+def write_member_rows(conn, rows, now):
+    """Upserts member_row() tuples and updates the derived tables in the same transaction. Caller commits."""
+    keys = [(row[0], row[6]) for row in rows]
+    before = channel_stats.snapshot(conn, keys)
+    conn.executemany(UPSERT_MEMBER_SQL, rows)
+    member_search.index_members(conn, keys, changed_at=now)
+    channel_overlap.record_joins(conn, [key for key in keys if key not in before])
+    # row: id, username, first, last, phone, is_bot, channel_id, status, ...
+    channel_stats.record_writes(conn, before, {(row[0], row[6]): (row[7], row[5], row[1]) for row in rows}, now)
+    status_history.record(conn, {(row[0], row[6]): row[7] for row in rows}, status_history.today(now))
 
 def save_member(user, channel_id):
     conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
     try:
-        status_label = get_user_status_label(user)
-        c.execute('''
-            INSERT OR REPLACE INTO members (id, username, first_name, last_name, phone, is_bot, channel_id, status)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (user.id, user.username or "", user.first_name or "", user.last_name or "", user.phone or "", 1 if user.bot else 0, channel_id, status_label))
+        now = int(time.time())
+        write_member_rows(conn, [member_row(user, channel_id, now)], now)
         conn.commit()
     except Exception as e:
         print(f"DB Error: {e}")
     finally:
         conn.close()
 
-def save_members_batch(users_data):
+def save_members_batch(users_data, scan_gen=None):
     """
-    users_data: list of tuples (user, channel_id)
+    users_data: list of tuples (user, channel_id) or (user, channel_id, status), where status is the
+                (label, last_online) pair the scan already got from classify_users()
+    scan_gen: generation of the scan saving them (None for event-driven saves)
     """
     conn = sqlite3.connect(DB_FILE)
+    try:
+        now = int(time.time())
+        data_to_insert = [member_row(item[0], item[1], now, scan_gen, item[2] if len(item) > 2 else None)
+                          for item in users_data]
+
+        with metrics.DB_BATCH_SECONDS.time():
+            write_member_rows(conn, data_to_insert, now)
+            conn.commit()
+    except Exception as e:
+        print(f"Batch DB Error: {e}")
+    finally:
+        conn.close()
+
+def mark_members_left(user_ids, channel_id):
+    """Flags members who left or were kicked; a later join or scan hit clears it."""
+    conn = sqlite3.connect(DB_FILE)
     c = conn.cursor()
     try:
-        data_to_insert = []
-        for user, channel_id in users_data:
-            status_label = get_user_status_label(user)
-            data_to_insert.append((
-                user.id, user.username or "", user.first_name or "", user.last_name or "", 
-                user.phone or "", 1 if user.bot else 0, channel_id, status_label
-            ))
-            
-        c.executemany('''
-            INSERT OR REPLACE INTO members (id, username, first_name, last_name, phone, is_bot, channel_id, status)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', data_to_insert)
+        now = int(time.time())
+        leaving = channel_stats.snapshot(conn, [(user_id, channel_id) for user_id in user_ids])
+        c.executemany(
+            'UPDATE members SET left_at = ?, updated_at = ? WHERE id = ? AND channel_id = ? AND left_at IS NULL',
+            [(now, now, user_id, channel_id) for user_id, _ in leaving]
+        )
+        channel_overlap.record_leaves(conn, list(leaving))
+        channel_stats.record_leaves(conn, leaving, now)
         conn.commit()
+        return len(leaving)
     except Exception as e:
-        print(f"Batch DB Error: {e}")
+        print(f"DB Error: {e}")
+        return 0
     finally:
         conn.close()
 
 def get_members(channel_id):
+    import pandas as pd
+
     conn = sqlite3.connect(DB_FILE)
     try:
-        df = pd.read_sql_query("SELECT * FROM members WHERE channel_id = ?", conn, params=(channel_id,))
+        # Members marked as left are not preloaded, so a rescan that finds them again re-saves them (clearing left_at)
+        df = pd.read_sql_query("SELECT * FROM members WHERE channel_id = ? AND left_at IS NULL", conn, params=(channel_id,))
         return df
     finally:
         conn.close()
@@ -350,51 +865,134 @@ if os.getenv("PROXY_HOST") and os.getenv("PROXY_PORT"):
         print("⚠️ Invalid Proxy Configuration")
 
 # Multi-Session Support
-session_files = glob.glob("*.session")
-clients = []
-worker_clients = []
-client = None # Main client
-
-print(f"🔎 Found {len(session_files)} session files: {session_files}")
-
-# 1. Initialize all clients
-for session_path in session_files:
-    s_name = os.path.splitext(os.path.basename(session_path))[0]
-    c = TelegramClient(s_name, api_id, api_hash, proxy=proxy)
-    clients.append(c)
+def load_clients():
+    """Creates a client per session file. Returns (clients, worker_clients, main client)."""
+    _sessions_t0 = time.perf_counter()
+    session_files = glob.glob("*.session")
+    if BOT_SESSIONS:
+        session_files = [f for f in session_files if os.path.splitext(os.path.basename(f))[0] in BOT_SESSIONS]
+    clients = []
+    worker_clients = []
+    client = None # Main client
+
+    print(f"🔎 Found {len(session_files)} session files: {session_files}")
+
+    # 1. Initialize all clients
+    for session_path in session_files:
+        s_name = os.path.splitext(os.path.basename(session_path))[0]
+        c = TelegramClient(s_name, api_id, api_hash, proxy=proxy)
+        clients.append(c)
     
-    # Identify main client (legacy "session" or first one)
-    if s_name == "session":
-        client = c
-    else:
-        worker_clients.append(c)
-
-# Fallback: If no "session.session" found, pick the first one as main
-if not client and clients:
-    client = clients[0]
-    # Remove from workers if it was added there
-    if client in worker_clients:
-        worker_clients.remove(client)
-
-# Fallback: If no sessions exist at all, create default
-if not clients:
-    print("⚠️ No sessions found. Creating default 'session'...")
-    client = TelegramClient("session", api_id, api_hash, proxy=proxy)
-    clients.append(client)
-
-# Add main client to workers pool so it can also be used for scanning
-worker_clients.append(client)
-
-print(f"✅ Main Client: {client.session.filename}")
-print(f"✅ Worker Clients: {len(worker_clients)}")
+        # Identify main client (legacy "session" or first one)
+        if s_name == "session":
+            client = c
+        else:
+            worker_clients.append(c)
+
+    # Fallback: If no "session.session" found, pick the first one as main
+    if not client and clients:
+        client = clients[0]
+        # Remove from workers if it was added there
+        if client in worker_clients:
+            worker_clients.remove(client)
+
+    # Fallback: If no sessions exist at all, create default
+    if not clients:
+        print("⚠️ No sessions found. Creating default 'session'...")
+        client = TelegramClient("session", api_id, api_hash, proxy=proxy)
+        clients.append(client)
+
+    # Add main client to workers pool so it can also be used for scanning
+    worker_clients.append(client)
+
+    print(f"✅ Main Client: {client.session.filename}")
+    print(f"✅ Worker Clients: {len(worker_clients)}")
+    startup_timings['sessions load'] = time.perf_counter() - _sessions_t0
+    return clients, worker_clients, client
+
+if __name__ == "__mp_main__":
+    # Export worker process (EXPORT_PROCESS_POOL) importing this file: it only runs export code
+    clients, worker_clients, client = [], [], None
+else:
+    clients, worker_clients, client = load_clients()
 
 # Global set to track which channels are being monitored to avoid duplicates
 monitored_channels = set()
 dashboard_messages = {}
 scan_progress = {}
+queued_scans = {}  # SCAN_QUEUE: channel_id -> (entity, status_msg) for jobs enqueued by this process
+# Scans running in this process: state, progress, request use; /scans, /pause, /resume, /cancel
+scans = ScanRegistry(RequestBudget(SCAN_REQUEST_BUDGET))
+last_admin_command = 0.0  # time of the last admin command; the idle refresh waits for quiet
+
+# Dialog index: channels/groups per client, built once and kept current from chat
+# events plus a periodic background refresh. /start, /monitor_all and startup_check
+# read it instead of walking iter_dialogs() on every call.
+DIALOG_REFRESH_INTERVAL = int(os.getenv("DIALOG_REFRESH_INTERVAL", "900"))
+dialog_index = {}  # client -> {chat_id: entity}
+dialog_index_locks = {}
+
+def is_admin_entity(entity):
+    return bool(getattr(entity, 'admin_rights', None) or getattr(entity, 'creator', False))
+
+async def build_dialog_index(c):
+    entries = {}
+    async for dialog in c.iter_dialogs():
+        if dialog.is_channel or dialog.is_group:
+            entries[dialog.entity.id] = dialog.entity
+    dialog_index[c] = entries
+    return entries
+
+async def get_dialog_index(c):
+    """Returns {chat_id: entity} for a client, building it on first use."""
+    if c in dialog_index:
+        return dialog_index[c]
+    lock = dialog_index_locks.setdefault(c, asyncio.Lock())
+    async with lock:
+        if c in dialog_index:
+            return dialog_index[c]
+        return await build_dialog_index(c)
+
+def update_dialog_entry(c, entity):
+    if c in dialog_index:
+        dialog_index[c][entity.id] = entity
+
+def remove_dialog_entry(c, chat_id):
+    if c in dialog_index:
+        dialog_index[c].pop(chat_id, None)
+
+async def dialog_refresh_loop():
+    """Rebuilds every client's index in the background to catch missed updates."""
+    while True:
+        await asyncio.sleep(DIALOG_REFRESH_INTERVAL)
+        for c in clients:
+            if not c.is_connected(): continue
+            try:
+                await build_dialog_index(c)
+            except Exception as e:
+                print(f"Dialog refresh failed: {e}")
 
-def generate_dashboard_menu(entity, monitoring_status=None, is_admin=False, can_ban=False):
-    """Generates the dashboard menu text."""
+async def on_channel_update(c, update):
+    """UpdateChannel fires on rights/title/membership changes: refresh that one entry."""
+    if c not in dialog_index:
+        return
+    try:
+        entity = await c.get_entity(PeerChannel(update.channel_id))
+    except Exception:
+        remove_dialog_entry(c, update.channel_id)
+        return
+    if isinstance(entity, ChannelForbidden) or getattr(entity, 'left', False):
+        remove_dialog_entry(c, update.channel_id)
+    else:
+        update_dialog_entry(c, entity)
+
+async def fetch_dashboard_stats(channel_id):
+    """channel_stats row for the dashboard, read in the DB executor; None if unavailable."""
+    try: return await run_in_executor(get_channel_stats, channel_id)
+    except Exception: return None
+
+def generate_dashboard_menu(entity, monitoring_status=None, is_admin=False, can_ban=False, stats=None):
+    """Generates the dashboard menu text. stats: get_channel_stats() row, fetched by the caller."""
     # Add timestamp to show when data was last relevant
     now_str = datetime.now().strftime("%H:%M")
     
@@ -402,6 +1000,10 @@ def generate_dashboard_menu(entity, monitoring_status=None, is_admin=False, can_
     menu += f"🕒 Last Check: {now_str}\n"
     menu += "━━━━━━━━━━━━━━━━━━━━━━\n"
 
+    # Live counts from the channel_stats aggregate (one primary-key lookup, no members scan)
+    if is_admin and stats:
+        menu += format_tier_counts(stats) + "\n\n"
+
     if is_admin:
         # 1. Monitoring & Indexing
         menu += "**📊 Monitoring & Indexing**\n"
@@ -417,6 +1019,7 @@ def generate_dashboard_menu(entity, monitoring_status=None, is_admin=False, can_
         menu += "• 📆 `/filter_month` - Week + Last 30 Days\n"
         menu += "• ♾️ `/filter_long` - ALL Members (Everything)\n"
         menu += "• 📦 `/filter_batch` - Download All 4 Files\n"
+        menu += "• 🆕 `/filter_delta` - Only New/Changed Since Last Delta\n"
             
     else:
         menu += "\n❌ **Access Restricted**\n"
@@ -429,12 +1032,26 @@ def generate_dashboard_menu(entity, monitoring_status=None, is_admin=False, can_
     menu += "🔙 `/menu` - Back to Channel List"
     return menu
 
-async def recursive_scan_task(entity, status_msg=None, scan_client=None):
-    """Background task to fully scan a channel."""
+async def recursive_scan_task(entity, status_msg=None, scan_client=None, on_progress=None, priority=None):
+    """
+    Background task to fully scan a channel. on_progress(found, total, text) is awaited
+    with every progress update (scan workers report to scan_queue with it).
+    priority: request budget priority (see scan_registry.py); idle refreshes run below 0.
+    Returns the number of saved members, or None if the scan failed.
+    """
     
     # Use provided scan_client or fallback to global client
     use_client = scan_client or client
 
+    if SCAN_RECORD_DIR:
+        from scan_replay import RecordingClient, fixture_path
+        os.makedirs(SCAN_RECORD_DIR, exist_ok=True)
+        use_client = RecordingClient(use_client, fixture_path(SCAN_RECORD_DIR, entity.id))
+
+    job = scans.start(entity.id, entity.title, getattr(entity, 'username', None), session_label(use_client),
+                      asyncio.current_task(), priority)
+    scan_gen = None
+
     try:
         # Get channel specific scan mode
         scan_mode = get_channel_pref(entity.id) or 'all'
@@ -452,12 +1069,18 @@ async def recursive_scan_task(entity, status_msg=None, scan_client=None):
              except:
                  total_members = 1000 # Estimate
 
+        save_channel_info(entity, total_members)
+
+        # Every member this run saves is tagged with its generation (see /scan_diff)
+        scan_gen = start_scan_generation(entity.id, scan_mode)
+
         found = 0
         last_update_time = time.time()
         
         # Helper to update progress message
         async def update_progress(current_count, current_char):
              nonlocal last_update_time
+             job.found, job.total, job.phase = current_count, total_members, current_char
              if time.time() - last_update_time < 3: # Update max every 3s
                  return
              
@@ -473,6 +1096,10 @@ async def recursive_scan_task(entity, status_msg=None, scan_client=None):
              )
              
              scan_progress[entity.id] = f"🔄 Scanning... ({pct:.1f}%)"
+
+             if on_progress:
+                 try: await on_progress(current_count, total_members, current_char)
+                 except Exception as e: print(f"Progress report failed: {e}")
              
              if status_msg:
                  try: await status_msg.edit(status_text)
@@ -482,7 +1109,8 @@ async def recursive_scan_task(entity, status_msg=None, scan_client=None):
              if entity.id in dashboard_messages:
                  try:
                      dash = dashboard_messages[entity.id]
-                     menu = generate_dashboard_menu(entity, f"🔄 Scanning... ({pct:.1f}%) Mode: {scan_mode}", True, True)
+                     stats = await fetch_dashboard_stats(entity.id)
+                     menu = generate_dashboard_menu(entity, f"🔄 Scanning... ({pct:.1f}%) Mode: {scan_mode}", True, True, stats)
                      await dash.edit(menu)
                  except: pass
 
@@ -490,53 +1118,84 @@ async def recursive_scan_task(entity, status_msg=None, scan_client=None):
             if scan_mode == 'smart_tiered':
                 return status_label in target_statuses
             if scan_mode == 'recent':
-                return status_label in ['online', 'today', 'recently']
+                return status_label in FILTER_STATUSES['recently']
             if scan_mode == 'week':
-                return status_label in ['online', 'today', 'recently', 'week']
+                return status_label in FILTER_STATUSES['week']
             return True
 
-        # Global semaphore for all queries (top-level and recursive) to respect FloodWait
-        query_sem = asyncio.Semaphore(5)
-
-        async def scan_query(query, target_statuses, depth=0):
+        async def save_page(page, target_statuses, label):
+            """Classifies a page of participants in one pass and saves the ones this phase keeps. Returns new members."""
             nonlocal found
-            batch_users = []
+            batch = []
+            new = 0
+            for user, status in zip(page, classify_users(page)):
+                if user.id in saved_this_run or not should_save_user(status[0], target_statuses):
+                    continue
+                # Known members are saved once per run too, to tag the generation and catch status changes
+                batch.append((user, entity.id, status))
+                saved_this_run.add(user.id)
+                if user.id not in existing_ids:
+                    existing_ids.add(user.id)
+                    found += 1
+                    new += 1
+            if batch:
+                save_members_batch(batch, scan_gen)
+                await update_progress(found, label)
+            return new
+
+        s_label = session_label(use_client)
+
+        queries_issued = 0
+
+        async def scan_query(query, target_statuses, depth=0, phase=1):
+            nonlocal queries_issued
             count_for_query = 0
+            new_for_query = 0
+            error = None
             
-            # Use global semaphore for API calls
-            async with query_sem:
-                # Debug log for visibility
-                print(f"Scanning: '{query}' (Depth: {depth})...")
-                try:
-                    async for user in use_client.iter_participants(entity, search=query):
-                        count_for_query += 1
-                        if user.id in existing_ids:
-                            continue
-                        status_label = get_user_status_label(user)
-                        if not should_save_user(status_label, target_statuses):
-                            continue
-                        batch_users.append((user, entity.id))
-                        existing_ids.add(user.id)
-                        found += 1
-                        if len(batch_users) >= 50:
-                            save_members_batch(batch_users)
-                            batch_users = []
-                            await update_progress(found, query)
-                except FloodWaitError as e:
-                    print(f"FloodWait: Sleeping {e.seconds}s")
-                    await asyncio.sleep(e.seconds + 2)
-                    # Retry logic could be added here, but recursive structure complicates it. 
-                    # For now, we skip this query on floodwait to keep moving, or better:
-                    # We should probably retry. But let's rely on simple skip for speed.
-                except Exception as e:
-                    print(f"Error scanning '{query}': {e}")
-
-            if batch_users:
-                save_members_batch(batch_users)
-                await update_progress(found, query)
+            # Every participant page (one request) takes a slot from the shared budget, and
+            # the next page waits there while the scan is paused
+            sem_wait = 0.0
+            queries_issued += 1
+            # Debug log for visibility
+            print(f"Scanning: '{query}' (Depth: {depth})...")
+            metrics.SCAN_REQUESTS.inc(session=s_label)
+            query_t0 = time.perf_counter()
+            try:
+                pages = scans.pages(job, use_client.iter_participants(entity, search=query), PARTICIPANT_PAGE_SIZE)
+                async for page, waited in pages:
+                    sem_wait += waited
+                    count_for_query += len(page)
+                    page = [user for user in page if user.id not in saved_this_run]
+                    if page:
+                        new_for_query += await save_page(page, target_statuses, query)
+            except FloodWaitError as e:
+                error = f"FloodWait {e.seconds}s"
+                print(f"FloodWait: Sleeping {e.seconds}s")
+                metrics.FLOODWAIT_SECONDS.inc(e.seconds, session=s_label)
+                job.floodwait_seconds += e.seconds
+                # The page's slot is already released, other scans keep going meanwhile
+                await asyncio.sleep(e.seconds + 2)
+                # Retry logic could be added here, but recursive structure complicates it. 
+                # For now, we skip this query on floodwait to keep moving, or better:
+                # We should probably retry. But let's rely on simple skip for speed.
+            except Exception as e:
+                error = str(e)
+                print(f"Error scanning '{query}': {e}")
+            metrics.SCAN_QUERY_SECONDS.observe(time.perf_counter() - query_t0, session=s_label)
+            metrics.SCAN_QUERY_USERS.observe(count_for_query)
+
+            recurse = count_for_query >= 100 and depth < 2
+            if scan_tracer:
+                # Span covers this query only (incl. its DB writes), not its children
+                scan_tracer.span(
+                    'query', channel=entity.id, prefix=query, depth=depth, phase=phase,
+                    duration=round(time.perf_counter() - query_t0, 4), results=count_for_query,
+                    new_users=new_for_query, sem_wait=round(sem_wait, 4), recursed=recurse, error=error
+                )
             
             # Parallelize recursion
-            if count_for_query >= 100 and depth < 2:
+            if recurse:
                 # OPTIMIZATION: Context-aware recursion to avoid mixing scripts unnecessarily
                 last_char = query[-1]
                 next_chars = []
@@ -559,7 +1218,7 @@ async def recursive_scan_task(entity, status_msg=None, scan_client=None):
                 sub_tasks = []
                 for ch in next_chars:
                     # No await here, gather later
-                    sub_tasks.append(scan_query(query + ch, target_statuses, depth + 1))
+                    sub_tasks.append(scan_query(query + ch, target_statuses, depth + 1, phase))
                 if sub_tasks:
                     await asyncio.gather(*sub_tasks)
 
@@ -571,7 +1230,7 @@ async def recursive_scan_task(entity, status_msg=None, scan_client=None):
         phases = []
         if scan_mode == 'smart_tiered':
             phases = [
-                (1, ['online', 'today', 'recently'], "Phase 1: Online & Recent"),
+                (1, FILTER_STATUSES['recently'], "Phase 1: Online & Recent"),
                 (2, ['week'], "Phase 2: Last Week"),
                 (3, ['month'], "Phase 3: Last Month"),
                 (4, ['long'], "Phase 4: Older Than Month")
@@ -584,6 +1243,7 @@ async def recursive_scan_task(entity, status_msg=None, scan_client=None):
         # Use executor to avoid blocking loop during heavy DB read
         df = await run_in_executor(get_members, entity.id)
         existing_ids = set(df['id'].tolist())
+        saved_this_run = set()
         found = len(existing_ids)
         print(f"DEBUG: Initial members loaded from DB: {found}")
 
@@ -591,38 +1251,22 @@ async def recursive_scan_task(entity, status_msg=None, scan_client=None):
         # Attempt to use iter_participants first. If it returns incomplete results (common in channels), fallback to search.
         if total_members < 10000:
             print(f"🚀 Small channel detected ({total_members}). Trying fast iteration strategy...")
-            pre_batch = []
             
             # Determine effective target statuses for filtering (if needed)
             fast_target_statuses = None
             if scan_mode == 'smart_tiered':
-                 fast_target_statuses = ['online', 'today', 'recently', 'week', 'month', 'long']
+                 fast_target_statuses = STATUS_LABELS
             
             try:
                 # Track how many we find in this pass
                 fast_found_count = 0
-                async for u in use_client.iter_participants(entity, limit=None):
-                    fast_found_count += 1
-                    if u.id in existing_ids:
-                        continue
-                        
-                    # Apply filter
-                    status_label = get_user_status_label(u)
-                    if not should_save_user(status_label, fast_target_statuses):
-                        continue
-                        
-                    pre_batch.append((u, entity.id))
-                    existing_ids.add(u.id)
-                    found += 1
-                    
-                    if len(pre_batch) >= 50:
-                        save_members_batch(pre_batch)
-                        pre_batch = []
-                        await update_progress(found, "Fast Scan")
-                        
-                if pre_batch:
-                    save_members_batch(pre_batch)
-                    await update_progress(found, "Fast Scan")
+                metrics.SCAN_REQUESTS.inc(session=s_label)
+                pages = scans.pages(job, use_client.iter_participants(entity, limit=None), PARTICIPANT_PAGE_SIZE)
+                async for page, _ in pages:
+                    fast_found_count += len(page)
+                    page = [u for u in page if u.id not in saved_this_run]
+                    if page:
+                        await save_page(page, fast_target_statuses, "Fast Scan")
                 
                 # Verify Completeness
                 # If we found significantly fewer members than total (and total is > 200), we probably hit a limit.
@@ -659,21 +1303,24 @@ async def recursive_scan_task(entity, status_msg=None, scan_client=None):
             queries_to_run = base_queries[current_start_index:]
             
             print(f"Starting {phase_desc} at index {current_start_index}...")
+            phase_t0 = time.perf_counter()
+            phase_found = found
+            phase_queries = queries_issued
             
-            # We don't need a local semaphore anymore, scan_query uses global query_sem
+            # No local semaphore: scan_query takes its slots from the shared request budget
             tasks = []
             
             async def run_wrapper(q, idx):
                  current_index = current_start_index + idx
                  save_checkpoint(entity.id, current_index, phase_num)
                  await update_progress(found, f"{q} ({phase_desc})")
-                 await scan_query(q, target_statuses)
+                 await scan_query(q, target_statuses, phase=phase_num)
 
             # Increase batch size for top-level tasks since semaphore is inside
             for idx, q in enumerate(queries_to_run):
                 tasks.append(asyncio.create_task(run_wrapper(q, idx)))
                 
-                # We can fire more tasks now, relying on query_sem to throttle
+                # We can fire more tasks now, relying on the request budget to throttle
                 if len(tasks) >= 20: 
                     await asyncio.gather(*tasks)
                     tasks = []
@@ -682,19 +1329,29 @@ async def recursive_scan_task(entity, status_msg=None, scan_client=None):
             
             if tasks:
                 await asyncio.gather(*tasks)
+
+            if scan_tracer:
+                scan_tracer.span(
+                    'phase', channel=entity.id, phase=phase_num, duration=round(time.perf_counter() - phase_t0, 3),
+                    queries=queries_issued - phase_queries, new_users=found - phase_found
+                )
             
             # Phase Complete - Reset start_index for next phase
             start_index = 0
 
         # Reset checkpoint after finish all phases
         save_checkpoint(entity.id, 0, 1)
+        finish_scan_generation(scan_gen)
+        if EXPORT_PREGENERATE:
+            asyncio.create_task(pregenerate_exports(entity.id, entity.title))
         scan_progress[entity.id] = "✅ Indexed"
 
         # Final Dashboard Update
         if entity.id in dashboard_messages:
              try:
                  dashboard_msg = dashboard_messages[entity.id]
-                 new_menu = generate_dashboard_menu(entity, "✅ Indexed", True, True)
+                 stats = await fetch_dashboard_stats(entity.id)
+                 new_menu = generate_dashboard_menu(entity, "✅ Indexed", True, True, stats)
                  await dashboard_msg.edit(new_menu)
              except: pass
 
@@ -708,9 +1365,27 @@ async def recursive_scan_task(entity, status_msg=None, scan_client=None):
                     f"📊 Coverage: 100%"
                 )
             except: pass
-            
+
+        scans.finish(job, 'done')
+        return found
+
+    except asyncio.CancelledError:
+        # /cancel: the checkpoint is kept, so a later /monitor resumes from it
+        print(f"⏹ Scan cancelled for {entity.title}")
+        scans.finish(job, 'cancelled')
+        scan_progress[entity.id] = "⏹ Scan cancelled"
+        monitored_channels.discard(entity.id)
+        if scan_gen:
+            try: abort_scan_generation(scan_gen, 'cancelled')
+            except Exception as e: print(f"Could not mark scan generation cancelled: {e}")
+        raise
     except Exception as e:
         print(f"Scan failed for {entity.title}: {e}")
+        scans.finish(job, 'failed')
+        monitored_channels.discard(entity.id)
+        if scan_gen:
+            try: abort_scan_generation(scan_gen, 'failed')
+            except Exception as e: print(f"Could not mark scan generation failed: {e}")
 
 async def monitor_channel(entity, event=None, dashboard_msg=None, use_client=None):
     """Sets up monitoring for a channel."""
@@ -731,7 +1406,8 @@ async def monitor_channel(entity, event=None, dashboard_msg=None, use_client=Non
             is_admin = await check_is_admin(entity, use_client)
             can_ban = await check_can_ban(entity, use_client)
             try:
-                new_menu = generate_dashboard_menu(entity, current_status, is_admin, can_ban)
+                stats = await fetch_dashboard_stats(entity.id) if is_admin else None
+                new_menu = generate_dashboard_menu(entity, current_status, is_admin, can_ban, stats)
                 await dashboard_msg.edit(new_menu)
             except: pass
 
@@ -780,6 +1456,14 @@ async def monitor_channel(entity, event=None, dashboard_msg=None, use_client=Non
     if event and not dashboard_msg:
         status_msg = await event.respond(f"👀 Started monitoring **{entity.title}**.\nPerforming initial sync in background...")
         
+    if SCAN_QUEUE:
+        # A --scan-worker process picks it up; scan_queue_poll_loop relays its progress
+        await run_in_executor(enqueue_scan, entity.id, entity.title)
+        queued_scans[entity.id] = (entity, status_msg)
+        scan_progress[entity.id] = "⏳ Queued for a scan worker"
+        print(f"📥 Queued scan for {entity.title}")
+        return
+
     # Start background scan
     await asyncio.sleep(1) 
     
@@ -806,16 +1490,189 @@ async def monitor_channel(entity, event=None, dashboard_msg=None, use_client=Non
     
     asyncio.create_task(recursive_scan_task(entity, status_msg, scan_client))
 
+async def scan_queue_poll_loop():
+    """Command process (SCAN_QUEUE): mirrors worker progress into dashboards and status messages."""
+    last_seen = {}
+    while True:
+        await asyncio.sleep(SCAN_QUEUE_POLL_INTERVAL)
+        try:
+            jobs = await run_in_executor(list_scan_jobs)
+        except Exception as e:
+            print(f"Scan queue poll failed: {e}")
+            continue
+
+        for channel_id, title, status, worker, found, total, progress, error, updated_at in jobs:
+            # updated_at is whole seconds: compare the full row so a 'done'/'failed' written
+            # in the same second as the last 'running' update isn't skipped
+            state = (status, found, progress, error, updated_at)
+            if channel_id not in queued_scans:
+                continue
+            if last_seen.get(channel_id) == state and status not in ('done', 'failed'):
+                continue
+            last_seen[channel_id] = state
+            entity, status_msg = queued_scans[channel_id]
+
+            if status == 'running':
+                pct = min((found / total) * 100, 99.9) if total else 0.0
+                scan_progress[channel_id] = f"🔄 Scanning... ({pct:.1f}%)"
+                text = (
+                    f"🔄 **Scanning {title}**\n"
+                    f"🛠 Worker: `{worker}`\n"
+                    f"📌 Phase: {progress or '-'}\n"
+                    f"👥 Found: {found} / {total or '?'}\n"
+                    f"📊 Progress: **{pct:.1f}%**"
+                )
+            elif status == 'done':
+                scan_progress[channel_id] = "✅ Indexed"
+                text = f"✅ **Scan Complete**\n📂 Channel: {title}\n👥 Total Saved: {found}"
+            elif status == 'failed':
+                scan_progress[channel_id] = f"❌ Scan failed: {error}"
+                text = f"❌ **Scan Failed**\n📂 Channel: {title}\n⚠️ {error}"
+            else:
+                continue
+
+            if status_msg:
+                try: await status_msg.edit(text)
+                except: pass
+            if channel_id in dashboard_messages:
+                stats = await fetch_dashboard_stats(channel_id)
+                try: await dashboard_messages[channel_id].edit(generate_dashboard_menu(entity, scan_progress[channel_id], True, True, stats))
+                except: pass
+            if status in ('done', 'failed'):
+                del queued_scans[channel_id]
+                # Allow a later /monitor to queue a fresh scan
+                monitored_channels.discard(channel_id)
+
+async def scan_worker_session(c):
+    """--scan-worker: claims and runs queued scans for channels this session can see."""
+    worker = f"{socket.gethostname()}:{os.getpid()}:{session_label(c)}"
+    print(f"🛠 Scan worker ready: {worker}")
+    while True:
+        try:
+            visible = await get_dialog_index(c)
+            job = await run_in_executor(claim_scan, worker, {cid for cid, e in visible.items() if is_admin_entity(e)})
+        except Exception as e:
+            print(f"Scan worker {worker}: claim failed: {e}")
+            job = None
+        if not job:
+            await asyncio.sleep(SCAN_QUEUE_POLL_INTERVAL)
+            continue
+
+        channel_id, title = job
+        entity = visible[channel_id]
+        print(f"🛠 {worker} claimed {title}")
+
+        async def report(found, total, text):
+            await run_in_executor(update_scan_job, channel_id, worker, None, found, total, text)
+
+        async def heartbeat():
+            # Keeps updated_at fresh while the scan makes no progress (FloodWait sleeps,
+            # slow pages) so the job isn't reclaimed as stale by another worker
+            while True:
+                await asyncio.sleep(SCAN_JOB_HEARTBEAT_SECONDS)
+                try: await run_in_executor(touch_scan_job, channel_id, worker)
+                except Exception as e: print(f"Scan worker {worker}: heartbeat failed: {e}")
+
+        beat = asyncio.create_task(heartbeat())
+        try:
+            found = await recursive_scan_task(entity, scan_client=c, on_progress=report)
+        finally:
+            beat.cancel()
+        if found is None:
+            await run_in_executor(update_scan_job, channel_id, worker, 'failed', None, None, None, "scan error (see worker log)")
+        else:
+            await run_in_executor(update_scan_job, channel_id, worker, 'done', found)
+
+async def admin_activity_handler(event):
+    """Notes every admin command so the idle refresh backs off (see refresh_scheduler_loop)."""
+    global last_admin_command
+    if is_bot_admin(event):
+        last_admin_command = time.time()
+
+async def refresh_candidates():
+    """
+    {channel_id: (client, entity)} for monitored channels in the dialog indexes that have no
+    active scan. Being in monitored_channels is also what makes /monitor refuse a second scan
+    while the refresh runs.
+    """
+    candidates = {}
+    for c in clients:
+        if not c.is_connected(): continue
+        for entity in (await get_dialog_index(c)).values():
+            if entity.id not in monitored_channels or entity.id in candidates:
+                continue
+            job = scans.jobs.get(entity.id)
+            if job and job.active:
+                continue
+            candidates[entity.id] = (c, entity)
+    return candidates
+
+async def refresh_scheduler_loop():
+    """Rescans the most overdue monitored channel whenever scans and admins are idle, one at a time."""
+    refresh_job = None
+    paused_here = False
+    while True:
+        await asyncio.sleep(REFRESH_CHECK_INTERVAL)
+        try:
+            admin_active = time.time() - last_admin_command < REFRESH_ADMIN_QUIET_SECONDS
+
+            if refresh_job and refresh_job.active:
+                if admin_active and refresh_job.state == 'running':
+                    scans.pause(refresh_job)
+                    paused_here = True
+                    scan_progress[refresh_job.channel_id] = "⏸ Refresh paused (admin active)"
+                    print(f"⏸ Idle refresh paused: {refresh_job.title}")
+                elif not admin_active and paused_here and refresh_job.state == 'paused':
+                    scans.resume(refresh_job)
+                    paused_here = False
+                    print(f"▶️ Idle refresh resumed: {refresh_job.title}")
+                continue
+            refresh_job, paused_here = None, False
+
+            # Only when the budget is idle: no scan in this process, none queued for workers
+            if admin_active or scans.budget.in_use or any(job.active for job in scans.jobs.values()):
+                continue
+            if SCAN_QUEUE and any(row[2] in ('queued', 'running') for row in await run_in_executor(list_scan_jobs)):
+                continue
+
+            candidates = await refresh_candidates()
+            due = await run_in_executor(get_refresh_order, list(candidates), REFRESH_INTERVAL_HOURS * 3600)
+            if not due:
+                continue
+            c, entity = candidates[due[0]]
+            print(f"🔁 Idle refresh: {entity.title} ({len(due)} channels due)")
+            if SCAN_QUEUE:
+                await run_in_executor(enqueue_scan, entity.id, entity.title)
+                continue
+            task = asyncio.create_task(recursive_scan_task(entity, scan_client=c, priority=REFRESH_PRIORITY))
+            await asyncio.sleep(0)  # let it register
+            job = scans.jobs.get(entity.id)
+            refresh_job = job if job and job.task is task else None
+        except Exception as e:
+            print(f"Refresh scheduler error: {e}")
+
 async def on_chat_action(event):
     """Listen for real-time joins and admin promotions (Permanent Listener)."""
     use_client = event.client
     try:
+        # input_peer=True is cached by Telethon after the first call (no request)
+        me_id = (await use_client.get_me(input_peer=True)).user_id
+
+        # Keep the dialog index in sync with our own membership and titles
+        if (event.user_left or event.user_kicked) and event.user_id == me_id:
+            remove_dialog_entry(use_client, utils.resolve_id(event.chat_id)[0])
+            return
+        if event.new_title:
+            update_dialog_entry(use_client, await event.get_chat())
+            return
+
         # Case 1: Bot added to channel/group or Promoted to Admin
-        if (event.user_added or event.user_joined) and event.user_id == (await use_client.get_me()).id:
+        if (event.user_added or event.user_joined) and event.user_id == me_id:
             print(f"🤖 Bot added/promoted in chat: {event.chat_id}")
             # Wait a moment for permissions to propagate
             await asyncio.sleep(2)
             entity = await event.get_chat()
+            update_dialog_entry(use_client, entity)
             
             # Check if we are admin
             if await check_is_admin(entity, use_client):
@@ -836,6 +1693,14 @@ async def on_chat_action(event):
                 # Save to DB immediately without waiting for manual /monitor
                 save_member(user, chat.id)
                 print(f"🆕 New member saved: {user.id} in {chat.title}")
+            return
+
+        # Case 3: Member left or was kicked (keeps the DB accurate without a rescan)
+        if event.user_left or event.user_kicked:
+            channel_id = utils.resolve_id(event.chat_id)[0]
+            marked = await run_in_executor(mark_members_left, event.user_ids, channel_id)
+            if marked:
+                print(f"👋 {marked} member(s) marked as left in {channel_id}")
                 
     except Exception as e:
         print(f"Event Error: {e}")
@@ -844,22 +1709,21 @@ async def on_chat_action(event):
 async def startup_check():
     print("Startup: Checking for admin channels to monitor...")
     
-    # Iterate over ALL active clients to check their dialogs
-    for c in clients:
-        if not c.is_connected(): continue
-        
-        try:
-            async for dialog in c.iter_dialogs():
-                if dialog.is_channel or dialog.is_group:
-                    entity = dialog.entity
-                    if getattr(entity, 'admin_rights', None) or getattr(entity, 'creator', False):
-                        if entity.id not in monitored_channels:
-                            print(f"Startup: Auto-monitoring {entity.title} (via {c.session.filename})")
-                            # We can pass 'c' as the event-like object or modify monitor_channel to accept client directly
-                            # For simplicity, we just trigger it and let it pick a worker
-                            asyncio.create_task(monitor_channel(entity, use_client=c))
-        except Exception as e:
-            print(f"Startup check failed for a client: {e}")
+    # Build every client's dialog index concurrently; /start and /monitor_all reuse it
+    connected = [c for c in clients if c.is_connected()]
+    indexes = await asyncio.gather(*(get_dialog_index(c) for c in connected), return_exceptions=True)
+
+    for c, entries in zip(connected, indexes):
+        if isinstance(entries, BaseException):
+            print(f"Startup check failed for a client: {entries}")
+            continue
+
+        for entity in entries.values():
+            if is_admin_entity(entity) and entity.id not in monitored_channels:
+                print(f"Startup: Auto-monitoring {entity.title} (via {c.session.filename})")
+                # We can pass 'c' as the event-like object or modify monitor_channel to accept client directly
+                # For simplicity, we just trigger it and let it pick a worker
+                asyncio.create_task(monitor_channel(entity, use_client=c))
 
     print("Startup check complete.")
     
@@ -934,12 +1798,11 @@ async def monitor_all_handler(event):
     use_client = event.client
     await event.respond("🔎 Scanning for ALL channels where I am admin...")
     count = 0
-    async for dialog in use_client.iter_dialogs():
-        if dialog.is_channel or dialog.is_group:
-            entity = dialog.entity
-            if getattr(entity, 'admin_rights', None) or getattr(entity, 'creator', False):
-                await monitor_channel(entity, event)
-                count += 1
+    entries = await get_dialog_index(use_client)
+    for entity in list(entries.values()):
+        if is_admin_entity(entity):
+            await monitor_channel(entity, event)
+            count += 1
     await event.respond(f"✅ Auto-monitoring started for {count} channels.")
 
 async def monitor_handler(event):
@@ -972,77 +1835,191 @@ async def filter_alias_handler(event):
     
     if mode == 'batch':
         await run_batch_filter_logic(event, chat_link)
+    elif mode == 'delta':
+        await run_delta_filter_logic(event, chat_link)
     else:
         await run_filter_logic(event, mode, chat_link)
 
-# Helper to run blocking DB/File operations in thread pool
+# Helper to run long export work in the export executor
 async def run_blocking_task(func, *args):
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, func, *args)
+    return await run_in_pool(export_executor, 'export', func, *args)
+
+def read_file_chunk(path, offset, size):
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        return f.read(size)
+
+async def upload_file_parallel(c, path, on_progress, sem):
+    """Uploads one file and returns its handle for send_file; big files go up as parallel chunks."""
+    size = os.path.getsize(path)
+    if size <= 10 * 1024 * 1024:
+        # Small files need an MD5 and are quick anyway: Telethon's sequential upload
+        sent = 0
+        async def progress(current, total):
+            nonlocal sent
+            await on_progress(current - sent)
+            sent = current
+        async with sem:
+            return await c.upload_file(path, progress_callback=progress)
+
+    file_id = helpers.generate_random_long()
+    part_count = (size + UPLOAD_CHUNK_SIZE - 1) // UPLOAD_CHUNK_SIZE
+
+    async def put(index):
+        async with sem:
+            chunk = await run_in_executor(read_file_chunk, path, index * UPLOAD_CHUNK_SIZE, UPLOAD_CHUNK_SIZE)
+            await c(functions.upload.SaveBigFilePartRequest(file_id, index, part_count, chunk))
+        await on_progress(len(chunk))
+
+    await asyncio.gather(*(put(i) for i in range(part_count)))
+    return InputFileBig(file_id, part_count, os.path.basename(path))
+
+async def send_export_files(c, chat_id, paths, caption, status_msg=None):
+    """
+    Splits oversized export files, uploads every part concurrently with progress on
+    status_msg, and sends them as one album. Returns the paths sent (the caller removes them).
+    """
+    parts = []
+    for path in paths:
+        parts.extend(await run_blocking_task(split_file, path, int(UPLOAD_PART_MAX_MB * 1024 * 1024)))
+    total = sum(os.path.getsize(part) for part in parts) or 1
+    done = 0
+    last_edit = time.time()
+
+    async def on_progress(n):
+        nonlocal done, last_edit
+        done += n
+        if status_msg and time.time() - last_edit >= 3:  # Update max every 3s
+            last_edit = time.time()
+            try: await status_msg.edit(f"📤 Uploading {len(parts)} file(s): **{done / total * 100:.0f}%** ({done / 1048576:.1f}/{total / 1048576:.1f} MB)")
+            except: pass
 
-def generate_batch_files_sync(channel_id, entity_title):
-    """Synchronous function to generate batch files to avoid blocking event loop."""
-    # Query DB
-    df = get_members(channel_id)
-    
-    if df.empty:
-        return None, f"⚠️ No members found in DB for **{entity_title}**. Run `/monitor` first."
-        
-    if 'status' not in df.columns:
-         return None, "⚠️ Database is old. Please run `/monitor` again to update member statuses."
+    sem = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+    handles = await asyncio.gather(*(upload_file_parallel(c, part, on_progress, sem) for part in parts))
+    await c.send_file(chat_id, list(handles), caption=caption, force_document=True)
+    return parts
+
+def get_export_version(channel_id):
+    """Last time any member row of the channel changed (the upsert only bumps updated_at on a real change)."""
+    conn = open_export_db(DB_FILE)
+    try:
+        return conn.execute("SELECT MAX(updated_at) FROM members WHERE channel_id = ?", (channel_id,)).fetchone()[0]
+    finally:
+        conn.close()
+
+def store_export_artifacts(channel_id, version, out_dir, results):
+    """Records pre-generated files for every mode, replacing the channel's previous ones."""
+    conn = sqlite3.connect(DB_FILE, timeout=30)
+    try:
+        now = int(time.time())
+        conn.executemany(
+            'INSERT OR REPLACE INTO export_artifacts (channel_id, mode, version, out_dir, paths, count, u_count, i_count, generated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            [(channel_id, mode, version, out_dir, json.dumps(paths), count, u_count, i_count, now)
+             for mode, (paths, count, u_count, i_count) in results.items()]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+def get_cached_exports(channel_id, modes):
+    """{mode: (paths, count, u_count, i_count)} if every mode has files built from the current data, else None."""
+    conn = open_export_db(DB_FILE)
+    try:
+        version = conn.execute("SELECT MAX(updated_at) FROM members WHERE channel_id = ?", (channel_id,)).fetchone()[0]
+        if version is None or not table_exists(conn, 'export_artifacts'):
+            return None
+        rows = conn.execute(
+            f"SELECT mode, paths, count, u_count, i_count FROM export_artifacts WHERE channel_id = ? AND version = ? AND mode IN ({','.join('?' * len(modes))})",
+            [channel_id, version, *modes]
+        ).fetchall()
+    finally:
+        conn.close()
+    cached = {mode: (json.loads(paths), count, u_count, i_count) for mode, paths, count, u_count, i_count in rows}
+    if len(cached) != len(modes) or not all(os.path.exists(p) for paths, *_ in cached.values() for p in paths):
+        return None
+    return cached
+
+async def pregenerate_exports(channel_id, title):
+    """
+    Builds every tier's usernames/ids files into the artifact cache after a scan. Tiers run
+    one at a time, so at most one export worker is taken from interactive exports.
+    """
+    try:
+        version = await run_in_executor(get_export_version, channel_id)
+        # updated_at is whole seconds: a change later in the version's second couldn't be
+        # told apart from it, so build only once the clock is past it. The scan's last
+        # batch is written in the second it finishes, so this usually waits once.
+        for _ in range(PREGENERATE_SETTLE_TRIES):
+            if version is None or version < int(time.time()):
+                break
+            await asyncio.sleep(version + 1 - time.time())
+            version = await run_in_executor(get_export_version, channel_id)
+        started = int(time.time())
+        if version is None or version >= started:
+            return
+        out_dir = os.path.join(EXPORT_CACHE_DIR, str(channel_id), str(started))
+        await run_in_executor(functools.partial(os.makedirs, out_dir, exist_ok=True))
+        results = {}
+        for mode in EXPORT_MODES:
+            paths, count, u_count, i_count = await run_blocking_task(export_tier_txt, DB_FILE, channel_id, title, mode, out_dir)
+            parts = []
+            for path in paths:
+                parts.extend(await run_blocking_task(split_file, path, int(UPLOAD_PART_MAX_MB * 1024 * 1024)))
+            results[mode] = (parts, count, u_count, i_count)
+
+        if await run_in_executor(get_export_version, channel_id) != version:
+            # Members changed while exporting; the next /filter_* builds fresh files
+            await run_in_executor(shutil.rmtree, out_dir, True)
+            return
+        await run_in_executor(store_export_artifacts, channel_id, version, out_dir, results)
+        await run_in_executor(prune_export_cache, channel_id, out_dir)
+        print(f"⚡ Exports pre-generated for {title}")
+    except Exception as e:
+        print(f"Export pre-generation failed for {title}: {e}")
+
+def prune_export_cache(channel_id, current_dir):
+    """
+    Deletes a channel's cached generations older than the one current_dir replaced. That
+    previous one is kept: a /filter_* that looked it up just before may still be uploading it.
+    """
+    channel_dir = os.path.join(EXPORT_CACHE_DIR, str(channel_id))
+    generations = sorted((int(name) for name in os.listdir(channel_dir) if name.isdigit()))
+    current = int(os.path.basename(current_dir))
+    older = [g for g in generations if g < current]
+    for generation in older[:-1]:
+        shutil.rmtree(os.path.join(channel_dir, str(generation)), ignore_errors=True)
+
+def discard_export_files(paths):
+    """Removes sent export files, except pre-generated ones that stay cached."""
+    cache_dir = os.path.abspath(EXPORT_CACHE_DIR) + os.sep
+    for f in paths:
+        if os.path.abspath(f).startswith(cache_dir):
+            continue
+        try: os.remove(f)
+        except: pass
+
+async def generate_batch_files(channel_id, entity_title):
+    """Generates the usernames/ids files for every tier, one export task per tier (or sends the pre-generated ones)."""
+    modes = EXPORT_MODES
+    cached = await run_in_executor(get_cached_exports, channel_id, modes)
+    if cached:
+        results = [cached[mode] for mode in modes]
+    else:
+        results = await asyncio.gather(*(
+            run_blocking_task(export_tier_txt, DB_FILE, channel_id, entity_title, mode) for mode in modes
+        ))
 
-    modes = ['recently', 'week', 'month', 'long']
     files_to_send = []
-    summary_text = f"📦 **Batch Export for {entity_title}**\n\n"
-    
-    safe_title = "".join([c for c in entity_title if c.isalpha() or c.isdigit() or c==' ']).strip()
-    
-    # Helper to get DF based on logic
-    def get_filtered_df(mode):
-        if mode == 'recently':
-            # Online + Today (24h) + Recently (Privacy hidden but active)
-            return df[df['status'].isin(['online', 'today', 'recently'])]
-        elif mode == 'week':
-            # All 'recently' + Week
-            return df[df['status'].isin(['online', 'today', 'recently', 'week'])]
-        elif mode == 'month':
-            # All 'week' + Month
-            return df[df['status'].isin(['online', 'today', 'recently', 'week', 'month'])]
-        elif mode == 'long':
-            # Everyone (The user requested 'long' to be ALL members)
-            return df
-        return pd.DataFrame()
-
-    for mode in modes:
-        filtered_df = get_filtered_df(mode)
-        count = len(filtered_df)
-        
+    summary_text = f"📦 **Batch Export for {entity_title}**{' ⚡' if cached else ''}\n\n"
+    for mode, (paths, count, u_count, i_count) in zip(modes, results):
         if count > 0:
-            base_filename = f"{safe_title}_{mode}_{count}"
-            
-            # Usernames
-            usernames = filtered_df['username'].dropna().tolist()
-            usernames = [u for u in usernames if u]
-            u_count = len(usernames)
-            u_file = f"{base_filename}_usernames.txt"
-            with open(u_file, 'w', encoding='utf-8') as f:
-                for u in usernames: f.write(f"{u}\n")
-            files_to_send.append(u_file)
-            
-            # IDs
-            ids = filtered_df['id'].tolist()
-            i_count = len(ids)
-            i_file = f"{base_filename}_ids.txt"
-            with open(i_file, 'w', encoding='utf-8') as f:
-                for i in ids: f.write(f"{i}\n")
-            files_to_send.append(i_file)
-
+            files_to_send.extend(paths)
             summary_text += f"• **{mode.title()}**: {count} (👤 {u_count} | 🆔 {i_count})\n"
         else:
              summary_text += f"• **{mode.title()}**: 0\n"
-    
+
     if not files_to_send:
-        return None, "⚠️ No members found in any category."
+        return None, f"⚠️ No members found in DB for **{entity_title}**. Run `/monitor` first."
 
     return files_to_send, summary_text
 
@@ -1061,82 +2038,265 @@ async def run_batch_filter_logic(event, chat_link):
         msg = await event.respond(f"📦 Generating ALL filter files for **{entity.title}**...\nThis may take a moment.")
 
         # Run heavy lifting in executor to prevent freezing the bot
-        files_to_send, result_text = await run_blocking_task(generate_batch_files_sync, entity.id, entity.title)
+        with metrics.EXPORT_SECONDS.time(kind='batch'):
+            files_to_send, result_text = await generate_batch_files(entity.id, entity.title)
         
         if not files_to_send:
             await msg.edit(result_text)
             return
 
         # Send all files
-        await use_client.send_file(event.chat_id, files_to_send, caption=result_text)
-        
-        for f in files_to_send:
-            try: os.remove(f)
-            except: pass
+        files_to_send = await send_export_files(use_client, event.chat_id, files_to_send, result_text, msg)
+        discard_export_files(files_to_send)
         
         await msg.edit("✅ فایل‌ها ارسال شد.")
 
     except Exception as e:
         await event.respond(f"❌ Batch Error: {e}")
 
-def generate_single_file_sync(channel_id, entity_title, mode):
-    """Synchronous function to generate single filter file."""
-    # Query DB
-    df = get_members(channel_id)
-    
-    if df.empty:
-        return None, f"⚠️ No members found in DB for **{entity_title}**. Run `/monitor` first."
-    
-    if 'status' not in df.columns:
-        return None, "⚠️ Database is old. Please run `/monitor` again to update member statuses."
-        
-    filtered_df = pd.DataFrame()
-    
-    if mode == 'recently':
-        filtered_df = df[df['status'].isin(['online', 'today', 'recently'])]
-    elif mode == 'week':
-        filtered_df = df[df['status'].isin(['online', 'today', 'recently', 'week'])]
-    elif mode == 'month':
-        filtered_df = df[df['status'].isin(['online', 'today', 'recently', 'week', 'month'])]
-    elif mode == 'long':
-        filtered_df = df
-        
-    count = len(filtered_df)
-    
+async def generate_single_file(channel_id, entity_title, mode, where_expr=None):
+    """Generates the usernames/ids files for one tier, optionally narrowed by a filter expression."""
+    cached = None
+    if not where_expr:
+        cached = await run_in_executor(get_cached_exports, channel_id, [mode])
+    if cached:
+        files_to_send, count, u_count, i_count = cached[mode]
+        # Same as skip_empty: no usernames file when nobody has one
+        if not u_count:
+            files_to_send = [f for f in files_to_send if '_usernames' not in os.path.basename(f)]
+    else:
+        files_to_send, count, u_count, i_count = await run_blocking_task(
+            export_tier_txt, DB_FILE, channel_id, entity_title, mode, '.', True, None, where_expr
+        )
+
+    label = f"{mode} {where_expr}" if where_expr else mode
     if count == 0:
-        return None, f"⚠️ No members found for filter: `{mode}`"
-        
-    safe_title = "".join([c for c in entity_title if c.isalpha() or c.isdigit() or c==' ']).strip()
-    base_filename = f"{safe_title}_{mode}_{count}"
-    
-    files_to_send = []
-    
-    # Usernames
-    usernames = filtered_df['username'].dropna().tolist()
-    usernames = [u for u in usernames if u]
-    u_count = len(usernames)
-    if usernames:
-        u_file = f"{base_filename}_usernames.txt"
-        with open(u_file, 'w', encoding='utf-8') as f:
-            for u in usernames: f.write(f"{u}\n")
-        files_to_send.append(u_file)
-        
-    # IDs
-    ids = filtered_df['id'].tolist()
-    i_count = len(ids)
-    if ids:
-        i_file = f"{base_filename}_ids.txt"
-        with open(i_file, 'w', encoding='utf-8') as f:
-            for i in ids: f.write(f"{i}\n")
-        files_to_send.append(i_file)
-        
-    return files_to_send, f"✅ Exported **{count}** members ({mode}).\n👤 Usernames: {u_count}\n🆔 IDs: {i_count}"
+        return None, f"⚠️ No members found for filter: `{label}`"
+
+    return files_to_send, f"✅ Exported **{count}** members ({label}).\n👤 Usernames: {u_count}\n🆔 IDs: {i_count}"
+
+def get_delta_watermark(consumer, channel_id, mode):
+    conn = open_export_db(DB_FILE)
+    try:
+        return get_watermark(conn, consumer, channel_id, mode)
+    finally:
+        conn.close()
+
+async def run_delta_filter_logic(event, args):
+    """/filter_delta [mode] [link]: only members added or changed since this chat's last delta export."""
+    valid_modes = list(FILTER_STATUSES)
+    parts = (args or "").split(maxsplit=1)
+    mode = 'long'
+    if parts and parts[0].lower() in valid_modes:
+        mode = parts.pop(0).lower()
+    chat_link = parts[0] if parts else None
+
+    use_client = event.client
+    try:
+        entity = await resolve_entity(event, chat_link)
+        if not entity:
+             await event.respond("❌ No target selected. Use `/select <link>` first.")
+             return
+
+        if not await check_is_admin(entity, use_client):
+            await event.respond(f"❌ I am not an admin in **{entity.title}**.\nAccess denied.")
+            return
+
+        since = await run_in_executor(get_delta_watermark, event.chat_id, entity.id, mode)
+        since_text = datetime.fromtimestamp(since).strftime('%Y-%m-%d %H:%M') if since else "the beginning (first delta)"
+        msg = await event.respond(f"🔍 Delta `{mode}` for **{entity.title}** since {since_text}...")
+
+        # Taken before the query: rows changed while exporting are picked up next time
+        exported_at = int(time.time())
+        with metrics.EXPORT_SECONDS.time(kind='delta'):
+            files_to_send, count, u_count, i_count = await run_blocking_task(
+                export_tier_txt, DB_FILE, entity.id, entity.title, mode, '.', True, since
+            )
+            # Leavers drop out of the tier, so the delta sends them separately
+            left_files, left_count = [], 0
+            if since is not None:
+                left_files, left_count, _, _ = await run_blocking_task(
+                    export_tier_txt, DB_FILE, entity.id, entity.title, mode, '.', True, since, None, True
+                )
+
+        if count:
+            caption = f"✅ **{count}** new/changed members ({mode}) since {since_text}.\n👤 Usernames: {u_count}\n🆔 IDs: {i_count}"
+            files_to_send = await send_export_files(use_client, event.chat_id, files_to_send, caption, msg)
+            for f in files_to_send:
+                try: os.remove(f)
+                except: pass
+        if left_count:
+            caption = f"🚪 **{left_count}** members ({mode}) left since {since_text}."
+            left_files = await send_export_files(use_client, event.chat_id, left_files, caption, msg)
+            for f in left_files:
+                try: os.remove(f)
+                except: pass
+
+        await run_in_executor(set_watermark, DB_FILE, event.chat_id, entity.id, mode, exported_at)
+        await msg.edit("✅ فایل‌ها ارسال شد." if count or left_count else f"✅ No new or changed members since {since_text}.")
+
+    except Exception as e:
+        await event.respond(f"❌ Delta Error: {e}")
+
+async def scan_diff_handler(event):
+    """/scan_diff [link]: joined/left/status changes between the last two completed scans."""
+    chat_link = event.pattern_match.group(1)
+    use_client = event.client
+    try:
+        entity = await resolve_entity(event, chat_link)
+        if not entity:
+             await event.respond("❌ No target selected. Use `/select <link>` first.")
+             return
+
+        if not await check_is_admin(entity, use_client):
+            await event.respond(f"❌ I am not an admin in **{entity.title}**.\nAccess denied.")
+            return
+
+        summary, path = await run_blocking_task(write_scan_diff, DB_FILE, entity.id, entity.title)
+        text = f"📊 **Scan Diff: {entity.title}**\n{format_scan_diff(summary)}"
+        if not path:
+            await event.respond(f"⚠️ {text}")
+            return
+
+        for part in await send_export_files(use_client, event.chat_id, [path], text):
+            try: os.remove(part)
+            except: pass
+
+    except Exception as e:
+        await event.respond(f"❌ Diff Error: {e}")
+
+def find_members(query, limit=20):
+    conn = open_export_db(DB_FILE)
+    try:
+        titles = dict(conn.execute("SELECT id, title FROM channels"))
+        return [member_search.format_result(row, titles) for row in member_search.search(conn, query, limit=limit)]
+    finally:
+        conn.close()
+
+async def find_handler(event):
+    """/find <name or username>: full-text lookup across every indexed channel."""
+    if not is_bot_admin(event):
+        return
+    query = event.pattern_match.group(1)
+    started = time.perf_counter()
+    try:
+        results = await run_in_executor(find_members, query)
+    except Exception as e:
+        await event.respond(f"❌ Search Error: {e}")
+        return
+    elapsed = (time.perf_counter() - started) * 1000
+    if not results:
+        await event.respond(f"🔎 No members match `{query}` ({elapsed:.0f}ms)")
+        return
+    await event.respond(f"🔎 **{len(results)}** match(es) for `{query}` ({elapsed:.0f}ms)\n━━━━━━━━━━━━━━━━━━━━━━\n" + "\n".join(results))
+
+def overlap_report(selectors):
+    conn = open_export_db(DB_FILE)
+    try:
+        channel_ids = []
+        for selector in selectors:
+            channel = resolve_export_channel(conn, selector)
+            if not channel:
+                return f"❌ Channel not found in DB: `{selector}`"
+            channel_ids.append(channel[0])
+        return channel_overlap.format_overlap(conn, channel_ids or None)
+    finally:
+        conn.close()
+
+async def overlap_handler(event):
+    """/overlap [channel ...]: shared members between indexed channels (3+ channels adds the N-way count)."""
+    if not is_bot_admin(event):
+        return
+    selectors = (event.pattern_match.group(1) or "").split()
+    started = time.perf_counter()
+    try:
+        text = await run_in_executor(overlap_report, selectors)
+    except Exception as e:
+        await event.respond(f"❌ Overlap Error: {e}")
+        return
+    await event.respond(f"🔗 **Audience Overlap** ({(time.perf_counter() - started) * 1000:.0f}ms)\n━━━━━━━━━━━━━━━━━━━━━━\n{text}")
+
+async def summary_handler(event):
+    """/summary [link]: tier, bot and username counts from the channel_stats aggregate."""
+    chat_link = event.pattern_match.group(1)
+    use_client = event.client
+    try:
+        entity = await resolve_entity(event, chat_link)
+        if not entity:
+             await event.respond("❌ No target selected. Use `/select <link>` first.")
+             return
+
+        if not await check_is_admin(entity, use_client):
+            await event.respond(f"❌ I am not an admin in **{entity.title}**.\nAccess denied.")
+            return
+
+        stats = await run_in_executor(get_channel_stats, entity.id)
+        if not stats:
+            await event.respond(f"⚠️ No members found in DB for **{entity.title}**. Run `/monitor` first.")
+            return
+
+        updated = datetime.fromtimestamp(stats['updated_at']).strftime('%Y-%m-%d %H:%M') if stats['updated_at'] else '?'
+        await event.respond(
+            f"📊 **Summary: {entity.title}**\n━━━━━━━━━━━━━━━━━━━━━━\n"
+            f"{format_tier_counts(stats, detailed=True)}\n🕒 Updated: {updated}"
+        )
+
+    except Exception as e:
+        await event.respond(f"❌ Summary Error: {e}")
+
+async def scans_handler(event):
+    """/scans: scans running in this process with progress and request use."""
+    if not is_bot_admin(event):
+        return
+    jobs = scans.listing()
+    budget = scans.budget
+    lines = [f"📡 **Scans** (requests: {budget.in_use}/{budget.slots} in use, {budget.waiting} waiting)", "━━━━━━━━━━━━━━━━━━━━━━"]
+    lines += [format_job(job) for job in jobs[:15]] or ["• No scans yet"]
+    if SCAN_QUEUE:
+        lines.append("ℹ️ Queued scans run in --scan-worker processes and are not listed here.")
+    await event.respond("\n".join(lines))
+
+async def scan_control_handler(event):
+    """/pause, /resume, /cancel <channel>; /priority <channel> <n> (higher gets request slots first)."""
+    if not is_bot_admin(event):
+        return
+    action = event.pattern_match.group(1)
+    selector = event.pattern_match.group(2).strip()
+    priority = None
+    if action == 'priority':
+        selector, _, value = selector.rpartition(' ')
+        if not selector or not value.lstrip('-').isdigit():
+            await event.respond("❌ Usage: `/priority <channel> <number>`")
+            return
+        priority = int(value)
+
+    job = scans.find(selector)
+    if not job:
+        await event.respond(f"❌ No scan found for `{selector}`. See /scans.")
+        return
+
+    if action == 'pause':
+        ok = scans.pause(job)
+        if ok: scan_progress[job.channel_id] = "⏸ Scan paused"
+    elif action == 'resume':
+        ok = scans.resume(job)
+        if ok: scan_progress[job.channel_id] = "🔄 Scanning..."
+    elif action == 'cancel':
+        ok = scans.cancel(job)
+    else:
+        job.priority = priority
+        ok = True
+
+    if ok:
+        await event.respond(f"✅ `{action}` applied to **{job.title}**.\n{format_job(job)}")
+    else:
+        await event.respond(f"⚠️ Can't {action} **{job.title}**: scan is {job.state}.")
 
 # Main filter handler (renamed to run_filter_logic for reuse)
-async def run_filter_logic(event, mode, chat_link):
+async def run_filter_logic(event, mode, chat_link, where_expr=None):
     # Map common aliases if needed, or just stick to English keys
     # recently, week, month, long
-    valid_modes = ['recently', 'week', 'month', 'long']
+    valid_modes = list(FILTER_STATUSES)
     
     if mode not in valid_modes:
         await event.respond(f"❌ Invalid filter. Modes: `recently`, `week`, `month`, `long`")
@@ -1153,30 +2313,54 @@ async def run_filter_logic(event, mode, chat_link):
             await event.respond(f"❌ I am not an admin in **{entity.title}**.\nAccess denied.")
             return
 
-        msg = await event.respond(f"🔍 Filtering `{mode}` for **{entity.title}**...")
+        msg = await event.respond(f"🔍 Filtering `{mode}{' ' + where_expr if where_expr else ''}` for **{entity.title}**...")
         
         # Run heavy lifting in executor
-        files_to_send, result_text = await run_blocking_task(generate_single_file_sync, entity.id, entity.title, mode)
+        try:
+            with metrics.EXPORT_SECONDS.time(kind='custom' if where_expr else mode):
+                files_to_send, result_text = await generate_single_file(entity.id, entity.title, mode, where_expr)
+        except FilterError as e:
+            await msg.edit(f"❌ {e}\nExample: `/filter week username:yes seen:5d bots:no in:@other`")
+            return
         
         if not files_to_send:
             await msg.edit(result_text)
             return
             
-        await use_client.send_file(event.chat_id, files_to_send, caption=result_text)
-        
-        for f in files_to_send:
-            try: os.remove(f)
-            except: pass
+        files_to_send = await send_export_files(use_client, event.chat_id, files_to_send, result_text, msg)
+        discard_export_files(files_to_send)
         
         await msg.edit("✅ فایل ارسال شد.")
 
     except Exception as e:
         await event.respond(f"❌ Filter Error: {e}")
 
+def looks_like_chat_link(token):
+    """t.me links, @usernames and (-100) numeric IDs; anything else is not a channel reference."""
+    lowered = token.lower()
+    return ('t.me/' in lowered or 'telegram.me/' in lowered or token.startswith('@')
+            or token.lstrip('-').isdigit())
+
 async def filter_handler(event):
-    mode = event.pattern_match.group(1).lower()
-    chat_link = event.pattern_match.group(2)
-    await run_filter_logic(event, mode, chat_link)
+    """
+    /filter <mode> [link] or /filter <terms...> [link], e.g. /filter week username:yes seen:5d in:@other.
+    Terms (key:value) are compiled to one SQL query by export_members.compile_filter.
+    """
+    mode = 'long'
+    chat_link = None
+    terms = []
+    for token in event.pattern_match.group(1).split():
+        if ':' in token and not token.lower().startswith(('http:', 'https:')):
+            terms.append(token)
+        elif token.lower() in FILTER_STATUSES:
+            mode = token.lower()
+        elif chat_link is None and looks_like_chat_link(token):
+            chat_link = token
+        else:
+            # e.g. a misspelled mode ("weak") must not be taken for a channel
+            await event.respond(f"❌ Invalid filter term: `{token}`")
+            return
+    await run_filter_logic(event, mode, chat_link, " ".join(terms) or None)
 
 async def help_handler(event):
     text = (
@@ -1186,16 +2370,77 @@ async def help_handler(event):
         "📡 /monitor یا /monitor <link>\n"
         "📊 /monitor_all\n"
         "🔎 /filter <recently|week|month|long> [link]\n"
+        "🧩 /filter week username:yes bots:no seen:5d joined:>2024-01-01 in:@other\n"
         "🟢 /filter_recently\n"
         "🗓 /filter_week\n"
         "📆 /filter_month\n"
         "♾️ /filter_long\n"
         "📦 /filter_batch\n"
+        "🆕 /filter_delta [mode] [link]\n"
+        "🔀 /scan_diff [link]\n"
+        "🔍 /find <name or @username>\n"
+        "🔗 /overlap [channel ...]\n"
+        "📊 /summary [link]\n"
+        "📡 /scans\n"
+        "⏯ /pause | /resume | /cancel <channel>\n"
+        "⬆️ /priority <channel> <n>\n"
+        "📈 /stats\n"
+        "🔬 /profile [seconds]\n"
         "━━━━━━━━━━━━━━━━━━━━━━\n"
         "نکته: ابتدا /monitor را اجرا کنید تا دیتا ساخته شود."
     )
     await event.respond(text)
 
+def format_stats():
+    """Human-readable summary of the metrics registry for /stats."""
+    lines = ["📈 **Bot Stats**", "━━━━━━━━━━━━━━━━━━━━━━"]
+
+    lines.append("**Requests per session**")
+    flood_by_session = dict(metrics.FLOODWAIT_SECONDS.items())
+    for (s_name,), count in metrics.SCAN_REQUESTS.items():
+        lines.append(f"• `{s_name}`: {count} queries, FloodWait {flood_by_session.get((s_name,), 0)}s")
+    if not metrics.SCAN_REQUESTS.items():
+        lines.append("• No scans yet")
+
+    for (s_name,), (count, avg, peak) in metrics.SCAN_QUERY_SECONDS.summary().items():
+        lines.append(f"⏱ Query latency `{s_name}`: avg {avg:.2f}s, max {peak:.2f}s")
+    for _, (count, avg, peak) in metrics.SCAN_QUERY_USERS.summary().items():
+        lines.append(f"👥 Users/query: avg {avg:.0f}, max {peak:.0f}")
+    for _, (count, avg, peak) in metrics.DB_BATCH_SECONDS.summary().items():
+        lines.append(f"💾 DB batches: {count}, avg {avg * 1000:.1f}ms, max {peak * 1000:.1f}ms")
+    for (kind,), (count, avg, peak) in metrics.EXPORT_SECONDS.summary().items():
+        lines.append(f"📦 Export `{kind}`: {count}x, avg {avg:.2f}s, max {peak:.2f}s")
+    inflight = dict(metrics.EXECUTOR_INFLIGHT.items())
+    for (pool,), (count, avg, peak) in metrics.EXECUTOR_WAIT_SECONDS.summary().items():
+        lines.append(f"🧵 Pool `{pool}`: {inflight.get((pool,), 0)} in flight, wait avg {avg * 1000:.1f}ms, max {peak * 1000:.1f}ms")
+    for _, (count, avg, peak) in metrics.LOOP_LAG_SECONDS.summary().items():
+        lines.append(f"🔁 Loop lag: avg {avg * 1000:.1f}ms, max {peak * 1000:.1f}ms")
+    return "\n".join(lines)
+
+async def stats_handler(event):
+    if not is_bot_admin(event):
+        return
+    await event.respond(format_stats())
+
+async def run_profile(seconds):
+    """Samples the event loop thread for `seconds` and writes a collapsed-stack file."""
+    path = f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.folded"
+    profiler = await profile_loop(seconds, path)
+    top = "\n".join(f"{pct:5.1f}%  {name}" for name, pct in profiler.top_functions(10))
+    print(f"🔬 Profile saved: {path} ({profiler.total} samples)\n{top}")
+    return path, profiler, top
+
+async def profile_handler(event):
+    if not is_bot_admin(event):
+        return
+    seconds = min(int(event.pattern_match.group(1) or 30), 300)
+    msg = await event.respond(f"🔬 Profiling event loop for {seconds}s...")
+    path, profiler, top = await run_profile(seconds)
+    await event.client.send_file(event.chat_id, path, caption=f"🔬 {profiler.total} samples\n`{top[:900]}`")
+    try: os.remove(path)
+    except: pass
+    await msg.delete()
+
 async def start_handler(event):
     """Lists all channels/groups the user is part of with admin status."""
     use_client = event.client
@@ -1205,22 +2450,18 @@ async def start_handler(event):
         lines = ["**📜 Select a Channel**", "Choose a channel to manage:\n"]
         
         count = 0
-        async for dialog in use_client.iter_dialogs():
-            if dialog.is_channel or dialog.is_group:
-                entity = dialog.entity
-                
-                # Determine status
-                is_admin = False
-                if getattr(entity, 'admin_rights', None) or getattr(entity, 'creator', False):
-                    is_admin = True
-                
-                status_icon = "👑" if is_admin else "👤"
-                status_text = "Admin" if is_admin else "Member"
-                
-                # Create a simple list item
-                lines.append(f"{status_icon} **{entity.title}** ({status_text})")
-                lines.append(f"👉 `/select_{entity.id}`\n")
-                count += 1
+        entries = await get_dialog_index(use_client)
+        for entity in entries.values():
+            # Determine status
+            is_admin = is_admin_entity(entity)
+            
+            status_icon = "👑" if is_admin else "👤"
+            status_text = "Admin" if is_admin else "Member"
+            
+            # Create a simple list item
+            lines.append(f"{status_icon} **{entity.title}** ({status_text})")
+            lines.append(f"👉 `/select_{entity.id}`\n")
+            count += 1
                 
         if count == 0:
             await msg.edit("❌ No channels or groups found.")
@@ -1282,11 +2523,35 @@ async def show_channel_dashboard(event, entity):
     status_text = scan_progress.get(entity.id, None)
 
     # Generate menu
-    menu = generate_dashboard_menu(entity, status_text, is_admin, can_ban)
+    stats = await fetch_dashboard_stats(entity.id) if is_admin else None
+    menu = generate_dashboard_menu(entity, status_text, is_admin, can_ban, stats)
     
     msg = await event.respond(menu)
     return msg
 
+def register_handlers(c):
+    """Registers all command and event handlers on one client."""
+    c.add_event_handler(admin_activity_handler, events.NewMessage(pattern=r'^/'))
+    c.add_event_handler(start_handler, events.NewMessage(pattern=r'/start|/menu'))
+    c.add_event_handler(scan_mode_handler, events.NewMessage(pattern=r'^/scan\s+'))
+    c.add_event_handler(select_handler, events.NewMessage(pattern=r'^/select\s+'))
+    c.add_event_handler(monitor_all_handler, events.NewMessage(pattern=r'^/monitor_all$'))
+    c.add_event_handler(monitor_handler, events.NewMessage(pattern=r'^/monitor(?:\s+(.*))?$'))
+    c.add_event_handler(filter_handler, events.NewMessage(pattern=r'^/filter\s+(.+)$'))
+    c.add_event_handler(filter_alias_handler, events.NewMessage(pattern=r'^/filter_(\w+)(?:\s+(.*))?$'))
+    c.add_event_handler(scan_diff_handler, events.NewMessage(pattern=r'^/scan_diff(?:\s+(.*))?$'))
+    c.add_event_handler(find_handler, events.NewMessage(pattern=r'^/find\s+(.+)$'))
+    c.add_event_handler(overlap_handler, events.NewMessage(pattern=r'^/overlap(?:\s+(.*))?$'))
+    c.add_event_handler(summary_handler, events.NewMessage(pattern=r'^/summary(?:\s+(.*))?$'))
+    c.add_event_handler(scans_handler, events.NewMessage(pattern=r'^/scans$'))
+    c.add_event_handler(scan_control_handler, events.NewMessage(pattern=r'^/(pause|resume|cancel|priority)\s+(.+)$'))
+    c.add_event_handler(help_handler, events.NewMessage(pattern=r'^/help$'))
+    c.add_event_handler(stats_handler, events.NewMessage(pattern=r'^/stats$'))
+    c.add_event_handler(profile_handler, events.NewMessage(pattern=r'^/profile(?:\s+(\d+))?$'))
+    c.add_event_handler(specific_select_handler, events.NewMessage(pattern=r'^/select_(-?\d+)'))
+    c.add_event_handler(on_chat_action, events.ChatAction)
+    c.add_event_handler(functools.partial(on_channel_update, c), events.Raw(UpdateChannel))
+
 # Old main function removed to avoid duplication
 # async def main(): ...
 
@@ -1297,77 +2562,87 @@ async def scan_and_export(link, to_csv=False, to_xlsx=True):
     else:
         entity = await client.get_entity(link)
     await recursive_scan_task(entity)
-    df = get_members(entity.id)
-    safe_title = "".join([c for c in entity.title if c.isalpha() or c.isdigit() or c==' ']).strip()
-    if to_xlsx:
-        xdf = df.rename(columns={
-            "id": "User ID",
-            "username": "Username",
-            "first_name": "First Name",
-            "last_name": "Last Name",
-            "phone": "Phone",
-            "is_bot": "Is Bot"
-        })
-        xdf['Is Bot'] = xdf['Is Bot'].apply(lambda x: 'Yes' if x == 1 else 'No')
-        xname = f"{safe_title}_{len(df)}.xlsx"
-        xdf.to_excel(xname, index=False)
-        print(f"Saved: {xname}")
-    if to_csv:
-        cname = f"{safe_title}_{len(df)}.csv"
-        df.to_csv(cname, index=False)
-        print(f"Saved: {cname}")
+
+    formats = []
+    if to_xlsx: formats.append('xlsx')
+    if to_csv: formats.append('csv')
+    if not formats:
+        return
+
+    # Stream rows from SQLite straight into the writers (no DataFrame copy)
+    with metrics.EXPORT_SECONDS.time(kind='cli'):
+        written, report = await run_blocking_task(export_channel_files, DB_FILE, entity.id, entity.title, 'long', formats)
+    for path in written:
+        print(f"Saved: {path}")
+    if written:
+        print(f"📊 Export: {format_report(report)}")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--export", type=str)
+    parser.add_argument("--csv", action="store_true", help="Also write CSV with --export")
+    parser.add_argument("--scan-worker", action="store_true", help="Only run scans claimed from scan_queue (no command handlers)")
     args = parser.parse_args()
     
     # Initialize DB
+    _db_t0 = time.perf_counter()
     init_db()
+    startup_timings['DB init'] = time.perf_counter() - _db_t0
     
     print(f"🚀 Starting {len(clients)} clients...")
     
     active_clients = []
     
-    # Helper to start clients asynchronously
+    # Connect every session concurrently: startup takes as long as the slowest
+    # session instead of the sum, and a hanging proxy only times out its own session.
+    async def start_one(c, s_name):
+        print(f"🔌 Connecting {s_name}...")
+        await c.connect()
+
+        if not await c.is_user_authorized():
+            raise Exception("session is NOT authorized")
+
+        me = await c.get_me()
+        session_user_ids.add(me.id)
+        print(f"✅ Session '{s_name}' authorized as: {me.first_name} ({me.id})")
+
     async def start_clients():
+        names = []
         for c in clients:
-            try:
-                # Use filename as identifier
-                s_name = "unknown"
-                try: s_name = os.path.basename(c.session.filename)
+            # Use filename as identifier
+            s_name = "unknown"
+            try: s_name = os.path.basename(c.session.filename)
+            except: pass
+            names.append(s_name)
+
+        results = await asyncio.gather(
+            *(asyncio.wait_for(start_one(c, s_name), SESSION_CONNECT_TIMEOUT) for c, s_name in zip(clients, names)),
+            return_exceptions=True
+        )
+
+        failed = []
+        for c, s_name, result in zip(clients, names, results):
+            if isinstance(result, BaseException):
+                reason = f"timed out after {SESSION_CONNECT_TIMEOUT:g}s" if isinstance(result, asyncio.TimeoutError) else str(result)
+                print(f"❌ Failed to start client {s_name}: {reason}")
+                failed.append((s_name, reason))
+                try: await c.disconnect()
                 except: pass
-                
-                print(f"🔌 Connecting {s_name}...")
-                await c.connect()
-                
-                if not await c.is_user_authorized():
-                    print(f"❌ Session '{s_name}' is NOT authorized! Skipping.")
-                    continue
-                
-                me = await c.get_me()
-                print(f"✅ Session '{s_name}' authorized as: {me.first_name} ({me.id})")
-                
-                # Register event handlers for EACH client
-                c.add_event_handler(start_handler, events.NewMessage(pattern=r'/start|/menu'))
-                c.add_event_handler(scan_mode_handler, events.NewMessage(pattern=r'^/scan\s+'))
-                c.add_event_handler(select_handler, events.NewMessage(pattern=r'^/select\s+'))
-                c.add_event_handler(monitor_all_handler, events.NewMessage(pattern=r'^/monitor_all$'))
-                c.add_event_handler(monitor_handler, events.NewMessage(pattern=r'^/monitor(?:\s+(.*))?$'))
-                c.add_event_handler(filter_handler, events.NewMessage(pattern=r'^/filter\s+(\w+)(?:\s+(.*))?$'))
-                c.add_event_handler(filter_alias_handler, events.NewMessage(pattern=r'^/filter_(\w+)(?:\s+(.*))?$'))
-                c.add_event_handler(help_handler, events.NewMessage(pattern=r'^/help$'))
-                c.add_event_handler(specific_select_handler, events.NewMessage(pattern=r'^/select_(-?\d+)'))
-                c.add_event_handler(on_chat_action, events.ChatAction)
-                
-                active_clients.append(c)
-                
-            except Exception as e:
-                print(f"❌ Failed to start client {s_name}: {e}")
+                continue
+
+            if not args.scan_worker:
+                register_handlers(c)
+            active_clients.append(c)
+
+        print(f"🔌 Sessions connected: {len(active_clients)}/{len(clients)}")
+        for s_name, reason in failed:
+            print(f"   ❌ {s_name}: {reason}")
 
     # Run the startup sequence
     loop = asyncio.get_event_loop()
+    _connect_t0 = time.perf_counter()
     loop.run_until_complete(start_clients())
+    startup_timings['session connect'] = time.perf_counter() - _connect_t0
     
     if not active_clients:
         print("❌ No active sessions found! Exiting.")
@@ -1388,13 +2663,36 @@ if __name__ == "__main__":
             sys.exit(1)
 
     print(f"🚀 Bot is running with {len(active_clients)} active sessions.")
+    print_startup_report()
 
     if args.export:
-        client.loop.run_until_complete(scan_and_export(args.export, to_csv=False, to_xlsx=False))
+        # Scans first, then writes the XLSX. For DB-only exports use export_members.py.
+        client.loop.run_until_complete(scan_and_export(args.export, to_csv=args.csv))
         sys.exit(0)
     
-    # Main Bot Loop
-    client.loop.create_task(startup_check())
+    if args.scan_worker:
+        for c in active_clients:
+            client.loop.create_task(scan_worker_session(c))
+    else:
+        # Main Bot Loop
+        client.loop.create_task(startup_check())
+        if SCAN_QUEUE:
+            client.loop.create_task(scan_queue_poll_loop())
+        if REFRESH_INTERVAL_HOURS > 0:
+            client.loop.create_task(refresh_scheduler_loop())
+    client.loop.create_task(dialog_refresh_loop())
+    client.loop.create_task(metrics.loop_lag_monitor())
+    if LOOP_WATCHDOG:
+        watchdog = LoopWatchdog(LOOP_BLOCK_THRESHOLD_MS / 1000, on_block=lambda secs, stack: metrics.LOOP_BLOCKS.inc())
+        watchdog.start()
+        print(f"🐢 Loop watchdog active (threshold {LOOP_BLOCK_THRESHOLD_MS}ms)")
+    # `kill -USR1 <pid>` profiles the running bot for 30s
+    if hasattr(signal, 'SIGUSR1'):
+        try: client.loop.add_signal_handler(signal.SIGUSR1, lambda: client.loop.create_task(run_profile(30)))
+        except (NotImplementedError, RuntimeError): pass
+    if METRICS_PORT:
+        client.loop.run_until_complete(metrics.start_http_server(METRICS_PORT))
+        print(f"📈 Metrics: http://127.0.0.1:{METRICS_PORT}/metrics")
     
     # Keep all clients running
     try:
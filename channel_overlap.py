@@ -0,0 +1,146 @@
+import argparse
+import sys
+import time
+
+from export_members import DB_FILE, SchemaError, open_db, resolve_channel, list_channels, table_exists
+
+# Audience overlap between channels. channel_overlap caches, for every channel pair
+# (channel_a < channel_b), how many current members (left_at IS NULL) they share; the
+# diagonal (channel_a = channel_b) holds each channel's current member count.
+# It is built once with a self-join on the members primary key and then kept current
+# by the bot's member writes: each membership that becomes active or inactive adjusts
+# only the pairs of that user's other channels.
+
+OVERLAP_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS channel_overlap (
+        channel_a INTEGER,
+        channel_b INTEGER,
+        shared INTEGER,
+        PRIMARY KEY (channel_a, channel_b)
+    )
+'''
+
+def rebuild(conn):
+    """Recomputes the whole matrix from members. Caller commits."""
+    conn.execute(OVERLAP_TABLE_SQL)
+    conn.execute("DELETE FROM channel_overlap")
+    conn.execute('''
+        INSERT INTO channel_overlap (channel_a, channel_b, shared)
+        SELECT channel_id, channel_id, COUNT(*) FROM members WHERE left_at IS NULL GROUP BY channel_id
+    ''')
+    conn.execute('''
+        INSERT INTO channel_overlap (channel_a, channel_b, shared)
+        SELECT a.channel_id, b.channel_id, COUNT(*)
+        FROM members a JOIN members b ON b.id = a.id AND b.channel_id > a.channel_id
+        WHERE a.left_at IS NULL AND b.left_at IS NULL
+        GROUP BY a.channel_id, b.channel_id
+    ''')
+
+def ensure_table(conn):
+    """Creates and fills channel_overlap the first time. Returns True if it was built."""
+    if table_exists(conn, 'channel_overlap'):
+        return False
+    rebuild(conn)
+    conn.commit()
+    return True
+
+def _apply(conn, keys, sign):
+    by_channel = {}
+    for user_id, channel_id in set(keys):
+        by_channel.setdefault(channel_id, []).append(user_id)
+    for channel_id, ids in by_channel.items():
+        # The user's other channels where they are current members
+        others = conn.execute(
+            f'''SELECT channel_id, COUNT(*) FROM members
+                WHERE id IN ({','.join('?' * len(ids))}) AND channel_id != ? AND left_at IS NULL
+                GROUP BY channel_id''',
+            [*ids, channel_id]
+        ).fetchall()
+        deltas = [(channel_id, channel_id, sign * len(ids))]
+        deltas += [(min(channel_id, other), max(channel_id, other), sign * n) for other, n in others]
+        conn.executemany('''
+            INSERT INTO channel_overlap (channel_a, channel_b, shared) VALUES (?, ?, ?)
+            ON CONFLICT(channel_a, channel_b) DO UPDATE SET shared = shared + excluded.shared
+        ''', deltas)
+
+def record_joins(conn, keys):
+    """keys [(id, channel_id)] just became current members (new rows or left_at cleared). Caller commits."""
+    _apply(conn, keys, 1)
+
+def record_leaves(conn, keys):
+    """keys [(id, channel_id)] just stopped being current members. Caller commits."""
+    _apply(conn, keys, -1)
+
+def matrix(conn, channel_ids=None):
+    """Returns (sizes {channel: members}, pairs [(a, b, shared)]) from the cache, largest overlap first."""
+    sizes, pairs = {}, []
+    for a, b, shared in conn.execute("SELECT channel_a, channel_b, shared FROM channel_overlap"):
+        if channel_ids is not None and (a not in channel_ids or b not in channel_ids):
+            continue
+        if a == b:
+            sizes[a] = shared
+        elif shared > 0:
+            pairs.append((a, b, shared))
+    pairs.sort(key=lambda p: -p[2])
+    return sizes, pairs
+
+def intersection_size(conn, channel_ids):
+    """Members present in every one of channel_ids (N-way), counted in SQL."""
+    channel_ids = list(set(channel_ids))
+    row = conn.execute(f'''
+        SELECT COUNT(*) FROM (
+            SELECT id FROM members
+            WHERE channel_id IN ({','.join('?' * len(channel_ids))}) AND left_at IS NULL
+            GROUP BY id HAVING COUNT(*) = ?
+        )
+    ''', [*channel_ids, len(channel_ids)]).fetchone()
+    return row[0]
+
+def format_overlap(conn, channel_ids=None, top=15):
+    """Text report: top pairs (with share of the smaller channel) and, for 3+ channels, the N-way overlap."""
+    titles = {cid: title for cid, title, _, _ in list_channels(conn)}
+    sizes, pairs = matrix(conn, set(channel_ids) if channel_ids else None)
+    lines = []
+    for a, b, shared in pairs[:top]:
+        smaller = min(sizes.get(a) or 1, sizes.get(b) or 1)
+        lines.append(f"• {titles.get(a, a)} ∩ {titles.get(b, b)}: {shared} ({shared / smaller * 100:.1f}% of smaller)")
+    if not lines:
+        lines.append("• No shared members")
+    if channel_ids and len(channel_ids) > 2:
+        lines.append(f"All {len(channel_ids)} channels: {intersection_size(conn, channel_ids)} shared members")
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Audience overlap between channels in members.db.")
+    parser.add_argument("channels", nargs="*", help="Limit to these channels (ID, @username or title); 3+ also prints the N-way overlap")
+    parser.add_argument("--db", default=DB_FILE)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    try:
+        conn = open_db(args.db)
+    except (FileNotFoundError, SchemaError) as e:
+        print(f"❌ {e}")
+        return 1
+
+    try:
+        if not table_exists(conn, 'channel_overlap'):
+            print("❌ No overlap cache yet. Start the bot once to build it.")
+            return 1
+        channel_ids = []
+        for selector in args.channels:
+            channel = resolve_channel(conn, selector)
+            if not channel:
+                print(f"❌ Channel not found in DB: {selector}")
+                return 1
+            channel_ids.append(channel[0])
+        print(format_overlap(conn, channel_ids or None, args.top))
+    finally:
+        conn.close()
+
+    print(f"✅ Done in {(time.perf_counter() - started) * 1000:.1f}ms")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
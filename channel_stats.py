@@ -0,0 +1,96 @@
+from export_members import STATUS_LABELS, table_exists
+
+# Per-channel member counts (current members only): total, one column per status label,
+# bots and members with a username. Built once from members, then adjusted by every member
+# write and leave from the before/after state of the touched rows, so the dashboard and
+# /summary never scan members.
+
+STATS_COLUMNS = ['total'] + STATUS_LABELS + ['bots', 'with_username']
+
+STATS_TABLE_SQL = f'''
+    CREATE TABLE IF NOT EXISTS channel_stats (
+        channel_id INTEGER PRIMARY KEY,
+        {", ".join(f"{col} INTEGER DEFAULT 0" for col in STATS_COLUMNS)},
+        updated_at INTEGER
+    )
+'''
+
+def rebuild(conn):
+    """Recomputes every channel's counts from members. Caller commits."""
+    conn.execute(STATS_TABLE_SQL)
+    conn.execute("DELETE FROM channel_stats")
+    status_sums = ", ".join(f"SUM(status = '{label}')" for label in STATUS_LABELS)
+    conn.execute(f'''
+        INSERT INTO channel_stats (channel_id, {", ".join(STATS_COLUMNS)}, updated_at)
+        SELECT channel_id, COUNT(*), {status_sums}, SUM(is_bot = 1), SUM(username != ''), CAST(strftime('%s', 'now') AS INTEGER)
+        FROM members WHERE left_at IS NULL GROUP BY channel_id
+    ''')
+
+def ensure_table(conn):
+    """Creates and fills channel_stats the first time. Returns True if it was built."""
+    if table_exists(conn, 'channel_stats'):
+        return False
+    rebuild(conn)
+    conn.commit()
+    return True
+
+def snapshot(conn, keys):
+    """{(id, channel_id): (status, is_bot, username)} for the keys that are current members."""
+    state = {}
+    by_channel = {}
+    for user_id, channel_id in keys:
+        by_channel.setdefault(channel_id, []).append(user_id)
+    for channel_id, ids in by_channel.items():
+        rows = conn.execute(
+            f'''SELECT id, status, is_bot, username FROM members
+                WHERE channel_id = ? AND left_at IS NULL AND id IN ({','.join('?' * len(ids))})''',
+            [channel_id, *ids]
+        )
+        for user_id, status, is_bot, username in rows:
+            state[(user_id, channel_id)] = (status, is_bot, username)
+    return state
+
+def _add(deltas, channel_id, state, sign):
+    status, is_bot, username = state
+    d = deltas.setdefault(channel_id, dict.fromkeys(STATS_COLUMNS, 0))
+    d['total'] += sign
+    if status in d:
+        d[status] += sign
+    if is_bot:
+        d['bots'] += sign
+    if username:
+        d['with_username'] += sign
+
+def _write(conn, deltas, now):
+    cols = ", ".join(STATS_COLUMNS)
+    updates = ", ".join(f"{col} = {col} + excluded.{col}" for col in STATS_COLUMNS)
+    conn.executemany(f'''
+        INSERT INTO channel_stats (channel_id, {cols}, updated_at) VALUES (?, {", ".join("?" * len(STATS_COLUMNS))}, ?)
+        ON CONFLICT(channel_id) DO UPDATE SET {updates}, updated_at = excluded.updated_at
+    ''', [(channel_id, *(d[col] for col in STATS_COLUMNS), now) for channel_id, d in deltas.items()])
+
+def record_writes(conn, before, after, now):
+    """
+    before: snapshot() taken before the upsert; after: {(id, channel_id): (status, is_bot, username)}
+    as written. Every written row is a current member afterwards. Caller commits.
+    """
+    deltas = {}
+    for key, state in before.items():
+        _add(deltas, key[1], state, -1)
+    for key, state in after.items():
+        _add(deltas, key[1], state, 1)
+    _write(conn, deltas, now)
+
+def record_leaves(conn, before, now):
+    """before: snapshot() of members that are now marked as left. Caller commits."""
+    deltas = {}
+    for key, state in before.items():
+        _add(deltas, key[1], state, -1)
+    _write(conn, deltas, now)
+
+def get_stats(conn, channel_id):
+    """{column: count} for one channel, or None if it has no rows yet."""
+    if not table_exists(conn, 'channel_stats'):
+        return None
+    row = conn.execute(f"SELECT {', '.join(STATS_COLUMNS)}, updated_at FROM channel_stats WHERE channel_id = ?", (channel_id,)).fetchone()
+    return dict(zip(STATS_COLUMNS + ['updated_at'], row)) if row else None
@@ -0,0 +1,648 @@
+import argparse
+import csv
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Offline exporter: reads members.db only. No Telethon, no sessions, no network.
+DB_FILE = "members.db"
+
+# Status labels stored by the bot, most recent first
+STATUS_LABELS = ['online', 'today', 'recently', 'week', 'month', 'long']
+
+# Status tiers used by /filter_*, the scanner's scan modes and this CLI ('long' means everyone)
+FILTER_STATUSES = {
+    'recently': STATUS_LABELS[:3],
+    'week': STATUS_LABELS[:4],
+    'month': STATUS_LABELS[:5],
+    'long': None,
+}
+
+# Upper bound in days of each label when the exact last-seen time is hidden
+STATUS_MAX_DAYS = {'online': 0, 'today': 1, 'recently': 3, 'week': 7, 'month': 30}
+
+EXPORT_FORMATS = ['csv', 'xlsx', 'txt', 'jsonl']
+
+# Rows pulled from the cursor per fetchmany(); bounds writer memory regardless of channel size
+EXPORT_CHUNK_SIZE = 5000
+
+EXPORT_COLUMNS = ['id', 'username', 'first_name', 'last_name', 'phone', 'is_bot', 'status']
+
+XLSX_HEADERS = {
+    'id': 'User ID',
+    'username': 'Username',
+    'first_name': 'First Name',
+    'last_name': 'Last Name',
+    'phone': 'Phone',
+    'is_bot': 'Is Bot',
+    'status': 'Status',
+}
+
+def safe_filename(title):
+    return "".join([c for c in title if c.isalpha() or c.isdigit() or c == ' ']).strip()
+
+class SchemaError(Exception):
+    pass
+
+def open_db(db_file=DB_FILE):
+    """Opens the DB read-only so an export can never modify it."""
+    if not os.path.exists(db_file):
+        raise FileNotFoundError(f"Database file {db_file} not found.")
+    conn = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+    # Migrations only run in the bot (init_db); queries here assume them (e.g. left_at)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(members)")}
+    if columns and 'left_at' not in columns:
+        conn.close()
+        raise SchemaError(f"{db_file} was created by an older version. Run the bot once to migrate it, then export again.")
+    return conn
+
+def table_exists(conn, name):
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name = ?", (name,)).fetchone()
+    return row is not None
+
+def list_channels(conn):
+    """Returns [(channel_id, title, username, member_count)] for every channel in the DB."""
+    counts = conn.execute("SELECT channel_id, SUM(left_at IS NULL) FROM members GROUP BY channel_id").fetchall()
+    info = {}
+    if table_exists(conn, 'channels'):
+        for cid, title, username in conn.execute("SELECT id, title, username FROM channels"):
+            info[cid] = (title, username)
+    result = []
+    for cid, count in counts:
+        title, username = info.get(cid, (None, None))
+        result.append((cid, title or str(cid), username, count))
+    return result
+
+def resolve_channel(conn, selector):
+    """Maps an ID, -100 ID, @username, t.me link or exact title to a channel_id in the DB."""
+    channels = list_channels(conn)
+    selector = selector.strip()
+
+    if re.fullmatch(r'-?\d+', selector):
+        cid = int(selector)
+        # Bot API style IDs (-100xxxxxxxxxx) are stored as the bare channel ID
+        if selector.startswith("-100"):
+            cid = int(selector[4:])
+        cid = abs(cid)
+        for channel in channels:
+            if channel[0] == cid:
+                return channel
+        return None
+
+    name = re.sub(r'^(https?://)?(t\.me/|telegram\.me/)', '', selector).lstrip('@').lower()
+    for channel in channels:
+        if channel[2] and channel[2].lower() == name:
+            return channel
+    for channel in channels:
+        if channel[1].lower() == selector.lower():
+            return channel
+    return None
+
+class FilterError(ValueError):
+    pass
+
+def _parse_date(value):
+    try:
+        return int(time.mktime(time.strptime(value, "%Y-%m-%d")))
+    except ValueError:
+        raise FilterError(f"Bad date `{value}` (use YYYY-MM-DD)")
+
+def compile_filter(conn, expr, channel_id=None):
+    """
+    Compiles a filter expression into (where_clauses, params, mode). Terms are ANDed:
+
+      recently|week|month|long   tier (same as tier:<mode>)
+      username:yes|no            has a username / has none
+      bots:no|only               exclude bots / only bots
+      seen:<N>d                  last seen within N days (exact time, or a hidden-time
+                                 tier whose bound fits, e.g. `recently` for N >= 3)
+      joined:>YYYY-MM-DD         joined (or first indexed) after/before a date; also joined:<
+      in:<channel>               also a current member of another channel (ID, @username, title)
+      notin:<channel>            not a member of another channel
+      active:<N>                 active (online/today/recently) on at least N of the last
+                                 30 days, from status_history; needs channel_id
+
+    Raises FilterError for unknown terms.
+    """
+    where, params = [], []
+    mode = 'long'
+    for term in expr.split():
+        key, _, value = term.partition(':')
+        key, value_l = key.lower(), value.lower()
+        if not value and key in FILTER_STATUSES:
+            key, value_l = 'tier', key
+
+        if key == 'tier':
+            if value_l not in FILTER_STATUSES:
+                raise FilterError(f"Unknown tier `{value}` ({', '.join(FILTER_STATUSES)})")
+            mode = value_l
+        elif key == 'username' and value_l in ('yes', 'no'):
+            where.append("username != ''" if value_l == 'yes' else "(username = '' OR username IS NULL)")
+        elif key == 'bots' and value_l in ('no', 'only'):
+            where.append("is_bot = 0" if value_l == 'no' else "is_bot = 1")
+        elif key == 'seen' and re.fullmatch(r'\d+d?', value_l):
+            days = int(value_l.rstrip('d'))
+            coarse = [label for label, bound in STATUS_MAX_DAYS.items() if bound <= days]
+            clause = "last_online >= ?"
+            params.append(int(time.time()) - days * 86400)
+            if coarse:
+                clause = f"({clause} OR (last_online IS NULL AND status IN ({','.join('?' * len(coarse))})))"
+                params.extend(coarse)
+            where.append(clause)
+        elif key == 'joined' and value[:1] in ('>', '<'):
+            # Join date from the participant record when Telegram gave one, else when we first indexed them
+            where.append(f"COALESCE(joined_at, first_seen) {value[0]} ?")
+            params.append(_parse_date(value[1:]))
+        elif key in ('in', 'notin') and value:
+            other = resolve_channel(conn, value)
+            if not other:
+                raise FilterError(f"Channel `{value}` is not in the DB")
+            op = "IN" if key == 'in' else "NOT IN"
+            where.append(f"id {op} (SELECT id FROM members WHERE channel_id = ? AND left_at IS NULL)")
+            params.append(other[0])
+        elif key == 'active' and re.fullmatch(r'\d+(/30)?', value_l):
+            from status_history import active_days_sql
+            if channel_id is None or not table_exists(conn, 'status_history'):
+                raise FilterError("`active:` needs a channel with status history")
+            where.append(f"id IN ({active_days_sql()})")
+            params.extend([channel_id, int(value_l.split('/')[0])])
+        else:
+            raise FilterError(f"Unknown filter term `{term}`")
+    return where, params, mode
+
+def build_member_query(channel_id, mode='long', exclude_bots=False, with_username=False, columns=None,
+                       include_left=False, since=None, extra_where=(), extra_params=()):
+    """
+    Builds a parameterized SELECT for one channel and tier (current members only unless include_left).
+    With since (unix time), only rows added or changed at or after it (delta export).
+    extra_where/extra_params come from compile_filter().
+    """
+    columns = columns or EXPORT_COLUMNS
+    where = ["channel_id = ?"] + list(extra_where)
+    params = [channel_id] + list(extra_params)
+
+    if since is not None:
+        where.append("updated_at >= ?")
+        params.append(since)
+    if not include_left:
+        where.append("left_at IS NULL")
+
+    statuses = FILTER_STATUSES[mode]
+    if statuses is not None:
+        where.append(f"status IN ({','.join('?' * len(statuses))})")
+        params.extend(statuses)
+    if exclude_bots:
+        where.append("is_bot = 0")
+    if with_username:
+        where.append("username != ''")
+
+    sql = f"SELECT {', '.join(columns)} FROM members WHERE {' AND '.join(where)}"
+    return sql, params
+
+def count_members(conn, channel_id, mode='long', exclude_bots=False, with_username=False, include_left=False,
+                  since=None, extra_where=(), extra_params=()):
+    sql, params = build_member_query(channel_id, mode, exclude_bots, with_username, ['COUNT(*)'], include_left, since,
+                                     extra_where, extra_params)
+    return conn.execute(sql, params).fetchone()[0]
+
+def get_watermark(conn, consumer, channel_id, mode):
+    """Start time of the consumer's last delta export for this channel/tier, or None."""
+    if not table_exists(conn, 'export_watermarks'):
+        return None
+    row = conn.execute(
+        "SELECT exported_at FROM export_watermarks WHERE consumer = ? AND channel_id = ? AND mode = ?",
+        (str(consumer), channel_id, mode)
+    ).fetchone()
+    return row[0] if row else None
+
+def set_watermark(db_file, consumer, channel_id, mode, exported_at):
+    """Records a finished delta export (separate writable connection; exports themselves are read-only)."""
+    conn = sqlite3.connect(db_file, timeout=30)
+    try:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS export_watermarks (
+                consumer TEXT, channel_id INTEGER, mode TEXT, exported_at INTEGER,
+                PRIMARY KEY (consumer, channel_id, mode)
+            )
+        ''')
+        conn.execute(
+            "INSERT OR REPLACE INTO export_watermarks (consumer, channel_id, mode, exported_at) VALUES (?, ?, ?, ?)",
+            (str(consumer), channel_id, mode, exported_at)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+def iter_chunks(cursor, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yields lists of at most chunk_size rows so only one chunk is ever in memory."""
+    while True:
+        chunk = cursor.fetchmany(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+def iter_rows(cursor, chunk_size=EXPORT_CHUNK_SIZE):
+    for chunk in iter_chunks(cursor, chunk_size):
+        yield from chunk
+
+def peak_rss_mb():
+    """Process peak RSS in MB (None where the resource module is unavailable)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    if sys.platform == 'darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+def write_csv(cursor, path):
+    count = 0
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_COLUMNS)
+        for chunk in iter_chunks(cursor):
+            writer.writerows(chunk)
+            count += len(chunk)
+    return count
+
+def write_jsonl(cursor, path):
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for row in iter_rows(cursor):
+            f.write(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False))
+            f.write("\n")
+            count += 1
+    return count
+
+# Excel opens at most 1,048,576 rows per sheet (header included); write-only openpyxl
+# doesn't enforce it, so bigger exports continue on "Members 2", "Members 3", ...
+XLSX_MAX_SHEET_ROWS = 1048575
+
+def write_xlsx(cursor, path):
+    """Streams rows into an openpyxl write-only workbook (cells are flushed, not kept)."""
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    bot_idx = EXPORT_COLUMNS.index('is_bot')
+    count = 0
+    ws = None
+    for row in iter_rows(cursor):
+        if count % XLSX_MAX_SHEET_ROWS == 0:
+            sheet = count // XLSX_MAX_SHEET_ROWS + 1
+            ws = wb.create_sheet("Members" if sheet == 1 else f"Members {sheet}")
+            ws.append([XLSX_HEADERS[c] for c in EXPORT_COLUMNS])
+        row = list(row)
+        row[bot_idx] = 'Yes' if row[bot_idx] == 1 else 'No'
+        ws.append(row)
+        count += 1
+    if ws is None:
+        wb.create_sheet("Members").append([XLSX_HEADERS[c] for c in EXPORT_COLUMNS])
+    wb.save(path)
+    return count
+
+def write_txt(cursor, ids_path, usernames_path):
+    """Writes the same _ids.txt / _usernames.txt pair the bot sends."""
+    id_idx = EXPORT_COLUMNS.index('id')
+    user_idx = EXPORT_COLUMNS.index('username')
+    i_count = 0
+    u_count = 0
+    with open(ids_path, 'w', encoding='utf-8') as fi, open(usernames_path, 'w', encoding='utf-8') as fu:
+        for row in iter_rows(cursor):
+            fi.write(f"{row[id_idx]}\n")
+            i_count += 1
+            if row[user_idx]:
+                fu.write(f"{row[user_idx]}\n")
+                u_count += 1
+    return i_count, u_count
+
+def export_channel(conn, channel_id, title, mode='long', formats=('csv',), out_dir='.',
+                   exclude_bots=False, with_username=False, report=None, include_left=False, since=None,
+                   where_expr=None):
+    """Exports one channel/tier in every requested format. Returns list of written paths.
+
+    If a dict is passed as report, it is filled with row count, elapsed time and how
+    much the process peak RSS grew while writing (MB).
+    """
+    extra_where, extra_params = (), ()
+    if where_expr:
+        extra_where, extra_params, mode = compile_filter(conn, f"{mode} {where_expr}", channel_id)
+    count = count_members(conn, channel_id, mode, exclude_bots, with_username, include_left, since,
+                          extra_where, extra_params)
+    # A delta of current members can't show who left since: leavers go to separate _left files
+    left_where, left_params = list(extra_where) + ["left_at >= ?"], list(extra_params) + [since]
+    left_count = 0
+    if since is not None and not include_left:
+        left_count = count_members(conn, channel_id, mode, exclude_bots, with_username, True, None,
+                                   left_where, left_params)
+    if count == 0 and left_count == 0:
+        return []
+
+    started = time.perf_counter()
+    rss_before = peak_rss_mb()
+
+    label = mode
+    if where_expr:
+        label += "_custom"
+    if since is not None:
+        label += "_delta"
+    written = []
+
+    def write_formats(base, sql, params):
+        for fmt in formats:
+            cursor = conn.execute(sql, params)
+            if fmt == 'csv':
+                write_csv(cursor, f"{base}.csv")
+                written.append(f"{base}.csv")
+            elif fmt == 'xlsx':
+                write_xlsx(cursor, f"{base}.xlsx")
+                written.append(f"{base}.xlsx")
+            elif fmt == 'jsonl':
+                write_jsonl(cursor, f"{base}.jsonl")
+                written.append(f"{base}.jsonl")
+            elif fmt == 'txt':
+                write_txt(cursor, f"{base}_ids.txt", f"{base}_usernames.txt")
+                written.extend([f"{base}_ids.txt", f"{base}_usernames.txt"])
+
+    if count:
+        write_formats(os.path.join(out_dir, f"{safe_filename(title)}_{label}_{count}"),
+                      *build_member_query(channel_id, mode, exclude_bots, with_username, include_left=include_left,
+                                          since=since, extra_where=extra_where, extra_params=extra_params))
+    if left_count:
+        write_formats(os.path.join(out_dir, f"{safe_filename(title)}_{label}_left_{left_count}"),
+                      *build_member_query(channel_id, mode, exclude_bots, with_username, include_left=True,
+                                          extra_where=left_where, extra_params=left_params))
+
+    if report is not None:
+        report['rows'] = count + left_count
+        report['seconds'] = time.perf_counter() - started
+        if rss_before is not None:
+            report['peak_growth_mb'] = peak_rss_mb() - rss_before
+    return written
+
+# Self-contained entry points (db path in, file paths out) so the bot can run them
+# in its export executor, including a process pool.
+
+def export_channel_files(db_file, channel_id, title, mode='long', formats=('csv',), out_dir='.'):
+    """Opens the DB and runs export_channel(). Returns (written_paths, report)."""
+    conn = open_db(db_file)
+    try:
+        report = {}
+        written = export_channel(conn, channel_id, title, mode, formats, out_dir, report=report)
+        return written, report
+    finally:
+        conn.close()
+
+def export_tier_txt(db_file, channel_id, title, mode, out_dir='.', skip_empty=False, since=None, where_expr=None,
+                    left=False):
+    """
+    Writes <title>_<mode>_<count>_usernames.txt and _ids.txt for one tier, as sent by /filter_*.
+    Returns (paths, count, username_count, id_count); paths is empty if the tier has no members.
+    With skip_empty, an empty usernames file is removed instead of returned.
+    With since, only members added or changed since then (files are named <mode>_delta);
+    with left as well, the members of the tier that left since then instead (<mode>_delta_left).
+    With where_expr, a compile_filter() expression narrows the tier (files are named <mode>_custom);
+    it may raise FilterError.
+    """
+    conn = open_db(db_file)
+    try:
+        extra_where, extra_params = (), ()
+        if where_expr:
+            extra_where, extra_params, mode = compile_filter(conn, f"{mode} {where_expr}", channel_id)
+        query_args = dict(since=since, extra_where=extra_where, extra_params=extra_params)
+        if left:
+            query_args = dict(include_left=True, extra_where=list(extra_where) + ["left_at >= ?"],
+                              extra_params=list(extra_params) + [since or 0])
+        count = count_members(conn, channel_id, mode, **query_args)
+        if count == 0:
+            return [], 0, 0, 0
+
+        label = mode + ("_custom" if where_expr else "") + ("_delta" if since is not None else "") + ("_left" if left else "")
+        base = os.path.join(out_dir, f"{safe_filename(title)}_{label}_{count}")
+        u_path = f"{base}_usernames.txt"
+        i_path = f"{base}_ids.txt"
+        sql, params = build_member_query(channel_id, mode, **query_args)
+        i_count, u_count = write_txt(conn.execute(sql, params), i_path, u_path)
+
+        paths = [u_path, i_path]
+        if skip_empty and u_count == 0:
+            os.remove(u_path)
+            paths = [i_path]
+        return paths, count, u_count, i_count
+    finally:
+        conn.close()
+
+def split_file(path, max_bytes):
+    """
+    Splits a line-based export (txt, csv, jsonl) into <name>_part<N><ext> files of at most
+    max_bytes each, cutting only at line ends; a CSV header is repeated in every part.
+    Returns [path] if the file already fits, else the part paths (the original is removed).
+    """
+    if os.path.getsize(path) <= max_bytes:
+        return [path]
+    base, ext = os.path.splitext(path)
+    parts = []
+    out = None
+    written = 0
+    with open(path, 'rb') as f:
+        header = f.readline() if ext == '.csv' else b''
+        if not header:
+            f.seek(0)
+        for line in f:
+            if out is None or (written + len(line) > max_bytes and written > len(header)):
+                if out:
+                    out.close()
+                parts.append(f"{base}_part{len(parts) + 1}{ext}")
+                out = open(parts[-1], 'wb')
+                out.write(header)
+                written = len(header)
+            out.write(line)
+            written += len(line)
+    if out:
+        out.close()
+    os.remove(path)
+    return parts
+
+# Scan diff: members are tagged with the last scan generation that saw them (last_seen_gen)
+# and the one before (prev_seen_gen, prev_status), so the two most recent complete scans
+# can be compared with index lookups instead of loading both snapshots.
+
+DIFF_COLUMNS = ['change', 'id', 'username', 'prev_status', 'status']
+
+def latest_generations(conn, channel_id):
+    """Returns (current, previous, running) generation rows; any may be None."""
+    if not table_exists(conn, 'scan_generations'):
+        return None, None, None
+    complete = conn.execute('''
+        SELECT id, scan_mode, started_at, finished_at, members_seen FROM scan_generations
+        WHERE channel_id = ? AND status = 'complete' ORDER BY id DESC LIMIT 2
+    ''', (channel_id,)).fetchall()
+    running = conn.execute(
+        "SELECT id, scan_mode, started_at FROM scan_generations WHERE channel_id = ? AND status = 'running' ORDER BY id DESC LIMIT 1",
+        (channel_id,)
+    ).fetchone()
+    current = complete[0] if complete else None
+    previous = complete[1] if len(complete) > 1 else None
+    return current, previous, running
+
+def iter_scan_diff(conn, channel_id, current_gen, previous_gen):
+    """Yields (change, id, username, prev_status, status) for joined, left and status-changed members."""
+    yield from conn.execute('''
+        SELECT 'joined', id, username, NULL, status FROM members
+        WHERE channel_id = ? AND last_seen_gen = ? AND (prev_seen_gen IS NULL OR prev_seen_gen != ?)
+    ''', (channel_id, current_gen, previous_gen))
+    yield from conn.execute('''
+        SELECT 'left', id, username, status, NULL FROM members
+        WHERE channel_id = ? AND last_seen_gen = ?
+    ''', (channel_id, previous_gen))
+    yield from conn.execute('''
+        SELECT 'status', id, username, prev_status, status FROM members
+        WHERE channel_id = ? AND last_seen_gen = ? AND prev_seen_gen = ? AND prev_status IS NOT status
+    ''', (channel_id, current_gen, previous_gen))
+
+def write_scan_diff(db_file, channel_id, title, out_dir='.'):
+    """
+    Compares the two most recent complete scans of a channel and writes every change to
+    <title>_diff_<prev>_<cur>.csv. Returns (summary, path); summary has 'error' if there is
+    nothing to compare, otherwise generation info and joined/left/status counts.
+    """
+    conn = open_db(db_file)
+    try:
+        current, previous, running = latest_generations(conn, channel_id)
+        if not previous:
+            return {'error': "Need two completed scans of this channel to compare."}, None
+        if running and running[0] > current[0]:
+            return {'error': "A scan is in progress; the diff is available when it finishes."}, None
+
+        summary = {
+            'previous': previous, 'current': current,
+            'joined': 0, 'left': 0, 'status': 0,
+            # Different scan modes save different status tiers, so tier changes look like joins/leaves
+            'mode_mismatch': previous[1] != current[1],
+        }
+        path = os.path.join(out_dir, f"{safe_filename(title)}_diff_{previous[0]}_{current[0]}.csv")
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(DIFF_COLUMNS)
+            for row in iter_scan_diff(conn, channel_id, current[0], previous[0]):
+                writer.writerow(row)
+                summary[row[0]] += 1
+        return summary, path
+    finally:
+        conn.close()
+
+def format_scan_diff(summary):
+    if 'error' in summary:
+        return summary['error']
+    prev, cur = summary['previous'], summary['current']
+    fmt = lambda ts: time.strftime('%Y-%m-%d %H:%M', time.localtime(ts)) if ts else '?'
+    text = (
+        f"Scan #{prev[0]} ({fmt(prev[3])}, {prev[4]} seen) -> #{cur[0]} ({fmt(cur[3])}, {cur[4]} seen)\n"
+        f"Joined: {summary['joined']}\nLeft (not seen again): {summary['left']}\nStatus changed: {summary['status']}"
+    )
+    if summary['mode_mismatch']:
+        text += f"\nNote: scan modes differ ({prev[1]} -> {cur[1]}), so some joins/leaves are only tier changes."
+    return text
+
+def format_report(report):
+    text = f"{report.get('rows', 0)} rows in {report.get('seconds', 0):.2f}s"
+    rss = peak_rss_mb()
+    if rss is not None:
+        text += f", peak RSS {rss:.1f} MB (+{report.get('peak_growth_mb', 0):.1f} MB during export)"
+    return text
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export members from members.db without connecting to Telegram.")
+    parser.add_argument("channels", nargs="*", help="Channel ID, -100 ID, @username, t.me link or title")
+    parser.add_argument("--all", action="store_true", help="Export every channel in the DB")
+    parser.add_argument("--list", action="store_true", help="List channels in the DB and exit")
+    parser.add_argument("--db", default=DB_FILE)
+    parser.add_argument("--mode", choices=list(FILTER_STATUSES), default='long')
+    parser.add_argument("--format", dest="formats", action="append", choices=EXPORT_FORMATS,
+                        help="Output format (repeatable, default: csv)")
+    parser.add_argument("--out-dir", default=".")
+    parser.add_argument("--no-bots", action="store_true", help="Exclude bot accounts")
+    parser.add_argument("--where", metavar="EXPR",
+                        help="Filter expression, e.g. \"week username:yes seen:5d in:@other\" (see compile_filter)")
+    parser.add_argument("--with-username", action="store_true", help="Only members that have a username")
+    parser.add_argument("--include-left", action="store_true", help="Also export members seen leaving or kicked")
+    parser.add_argument("--delta", nargs="?", const="cli", metavar="CONSUMER",
+                        help="Only members added/changed since CONSUMER's last --delta export (default consumer: cli)")
+    parser.add_argument("--diff", action="store_true",
+                        help="Write joined/left/status changes between the last two completed scans instead of exporting")
+    parser.add_argument("--report-memory", action="store_true", help="Print time and peak memory per export")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    try:
+        conn = open_db(args.db)
+    except (FileNotFoundError, SchemaError) as e:
+        print(f"❌ {e}")
+        return 1
+
+    try:
+        if args.list:
+            for cid, title, username, count in list_channels(conn):
+                handle = f" @{username}" if username else ""
+                print(f"{cid}\t{count}\t{title}{handle}")
+            return 0
+
+        if args.all:
+            targets = list_channels(conn)
+        else:
+            if not args.channels:
+                parser.error("give at least one channel, or use --all / --list")
+            targets = []
+            for selector in args.channels:
+                channel = resolve_channel(conn, selector)
+                if not channel:
+                    print(f"❌ Channel not found in DB: {selector}")
+                    return 1
+                targets.append(channel)
+
+        os.makedirs(args.out_dir, exist_ok=True)
+        if args.diff:
+            for cid, title, _, _ in targets:
+                summary, path = write_scan_diff(args.db, cid, title, args.out_dir)
+                print(f"📊 {title}\n{format_scan_diff(summary)}")
+                if path:
+                    print(f"Saved: {path}")
+            return 0
+
+        formats = args.formats or ['csv']
+        for cid, title, _, _ in targets:
+            report = {} if args.report_memory else None
+            since = None
+            if args.delta:
+                since = get_watermark(conn, args.delta, cid, args.mode)
+                # Taken before the query: rows changed while exporting are picked up next time
+                exported_at = int(time.time())
+            try:
+                written = export_channel(conn, cid, title, args.mode, formats, args.out_dir,
+                                         args.no_bots, args.with_username, report, args.include_left, since, args.where)
+            except FilterError as e:
+                print(f"❌ {e}")
+                return 1
+            if args.delta:
+                set_watermark(args.db, args.delta, cid, args.mode, exported_at)
+            if not written:
+                print(f"⚠️ No members for `{args.mode}` in {title}")
+            for path in written:
+                print(f"Saved: {path}")
+            if written and report is not None:
+                print(f"📊 {title}: {format_report(report)}")
+    finally:
+        conn.close()
+
+    print(f"✅ Done in {time.perf_counter() - started:.3f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
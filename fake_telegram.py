@@ -0,0 +1,236 @@
+import asyncio
+import bisect
+import heapq
+import random
+from array import array
+from datetime import datetime, timezone, timedelta
+
+from telethon.errors import FloodWaitError
+from telethon.helpers import TotalList
+from telethon.tl.types import User, UserStatusOnline, UserStatusOffline, UserStatusRecently, UserStatusLastWeek, UserStatusLastMonth, UserStatusEmpty
+
+# Local stand-in for TelegramClient over a synthetic channel. Implements only what
+# recursive_scan_task needs (get_entity, get_participants(limit=0), iter_participants
+# with and without search) so scans can be benchmarked without a live account.
+
+# Telegram serves 200 participants per GetParticipants request
+PAGE_SIZE = 200
+
+# Status codes stored per user (one byte each)
+ST_ONLINE, ST_OFFLINE, ST_RECENTLY, ST_LASTWEEK, ST_LASTMONTH, ST_EMPTY = range(6)
+
+# Rough real-world mix of status types
+STATUS_WEIGHTS = [
+    (ST_ONLINE, 3), (ST_OFFLINE, 35), (ST_RECENTLY, 30),
+    (ST_LASTWEEK, 12), (ST_LASTMONTH, 10), (ST_EMPTY, 10),
+]
+
+NAME_DISTRIBUTIONS = ['latin', 'persian', 'numeric', 'mixed']
+
+LATIN_ONSETS = list("amsdjrbkcelnpgvhofiwyquzx")
+LATIN_SYLLABLES = ["a", "an", "ar", "el", "en", "i", "in", "is", "o", "on", "or", "u", "us", "ra", "ri", "ma", "na", "la", "sa", "da", "ta", "ne", "me", "le"]
+PERSIAN_ONSETS = ['ا', 'آ', 'م', 'س', 'ر', 'ن', 'ب', 'د', 'پ', 'ت', 'ک', 'ه', 'و', 'ی', 'ف', 'ش', 'ج', 'ح', 'خ', 'ل', 'ع', 'ق', 'گ', 'ز']
+PERSIAN_SYLLABLES = ["ا", "ی", "و", "ر", "ن", "م", "د", "ه", "س", "ل", "ب", "ت", "ک", "ز", "ف"]
+
+def _make_vocab(rng, kind, size):
+    words = set()
+    while len(words) < size:
+        if kind == 'numeric':
+            words.add("".join(rng.choice("0123456789") for _ in range(rng.randint(3, 7))))
+            continue
+        # Skew first letters towards the front of the list (frequency-ordered)
+        onsets = LATIN_ONSETS if kind == 'latin' else PERSIAN_ONSETS
+        syllables = LATIN_SYLLABLES if kind == 'latin' else PERSIAN_SYLLABLES
+        onset = onsets[min(int(rng.expovariate(1 / 5)), len(onsets) - 1)]
+        words.add(onset + "".join(rng.choice(syllables) for _ in range(rng.randint(1, 3))))
+    return sorted(words)
+
+class FakeChannel:
+    """Minimal Channel-like entity."""
+
+    def __init__(self, channel_id, title, participants_count, username=None):
+        self.id = channel_id
+        self.title = title
+        self.username = username
+        self.participants_count = participants_count
+
+class FakeSession:
+    def __init__(self, filename):
+        self.filename = filename
+
+class FakeTelegramClient:
+    """
+    Serves a synthetic channel of `size` users.
+
+    names: 'latin', 'persian', 'numeric' or 'mixed'
+    latency: seconds slept per request (one page of up to 200 users)
+    flood_rate: probability a request raises FloodWaitError(flood_seconds)
+    search_limit: max results returned for one search query
+    list_limit: max results for iter_participants() without search
+    hide_count: report participants_count=None so callers fall back to get_participants(limit=0)
+    """
+
+    def __init__(self, size=10000, names='mixed', latency=0.0, flood_rate=0.0, flood_seconds=0,
+                 search_limit=200, list_limit=200, hide_count=False, seed=0, channel_id=1000001):
+        if names not in NAME_DISTRIBUTIONS:
+            raise ValueError(f"names must be one of {NAME_DISTRIBUTIONS}")
+        self.size = size
+        self.latency = latency
+        self.flood_rate = flood_rate
+        self.flood_seconds = flood_seconds
+        self.search_limit = search_limit
+        self.list_limit = list_limit
+        self.hide_count = hide_count
+        self.rng = random.Random(seed)
+        self.session = FakeSession(f"fake_{names}_{size}.session")
+        self.channel = FakeChannel(channel_id, f"Fake {names} {size}", size)
+        self.now = datetime.now(timezone.utc)
+
+        # Request accounting for benchmarks
+        self.requests = 0
+        self.search_requests = 0
+        self.flood_waits = 0
+        self.users_served = 0
+
+        self._build(names)
+
+    # --- synthetic population -------------------------------------------------
+
+    def _build(self, names):
+        rng = self.rng
+        kinds = ['latin', 'persian', 'numeric'] if names == 'mixed' else [names]
+        kind_weights = {'latin': 50, 'persian': 40, 'numeric': 10}
+
+        # One vocabulary per script; first/last names index into the combined vocab
+        self.vocab = []
+        vocab_ranges = []
+        for kind in kinds:
+            words = _make_vocab(rng, kind, 3000 if kind != 'numeric' else 2000)
+            vocab_ranges.append((len(self.vocab), len(words)))
+            self.vocab.extend(words)
+
+        n = self.size
+        # Zipf-like popularity within each vocabulary
+        kind_of_user = rng.choices(range(len(kinds)), weights=[kind_weights[k] for k in kinds], k=n)
+        self.first = array('i', [0]) * n
+        self.last = array('i', [-1]) * n
+        for k, (start, count) in enumerate(vocab_ranges):
+            cum = []
+            total = 0.0
+            for rank in range(count):
+                total += 1.0 / (rank + 1)
+                cum.append(total)
+            members = [i for i in range(n) if kind_of_user[i] == k]
+            picks = rng.choices(range(start, start + count), cum_weights=cum, k=len(members) * 2)
+            for j, i in enumerate(members):
+                self.first[i] = picks[2 * j]
+                # About half the users set a last name
+                if picks[2 * j + 1] % 2 == 0:
+                    self.last[i] = picks[2 * j + 1]
+
+        self.has_username = bytearray(1 if rng.random() < 0.4 else 0 for _ in range(n))
+        self.is_bot = bytearray(1 if rng.random() < 0.005 else 0 for _ in range(n))
+        codes = [c for c, _ in STATUS_WEIGHTS]
+        self.status = bytearray(rng.choices(codes, weights=[w for _, w in STATUS_WEIGHTS], k=n))
+        # Seconds since last seen for ST_OFFLINE users (up to ~90 days, skewed recent)
+        self.offline_for = array('i', (int(min(rng.expovariate(1 / 86400 / 7), 86400 * 90)) for _ in range(n)))
+
+        # Inverted index: sorted vocab -> ascending user indices (first and last names)
+        self.sorted_vocab = sorted(range(len(self.vocab)), key=lambda w: self.vocab[w].lower())
+        self.sorted_words = [self.vocab[w].lower() for w in self.sorted_vocab]
+        self.postings = [array('i') for _ in self.vocab]
+        for i in range(n):
+            self.postings[self.first[i]].append(i)
+            if self.last[i] >= 0 and self.last[i] != self.first[i]:
+                self.postings[self.last[i]].append(i)
+
+    def user_id(self, idx):
+        return 10_000_000 + idx
+
+    def make_user(self, idx):
+        first = self.vocab[self.first[idx]]
+        last = self.vocab[self.last[idx]] if self.last[idx] >= 0 else None
+        username = None
+        if self.has_username[idx] and first.isascii() and first.isalpha():
+            username = f"{first}{idx % 997}"
+
+        code = self.status[idx]
+        if code == ST_ONLINE:
+            status = UserStatusOnline(expires=self.now + timedelta(minutes=5))
+        elif code == ST_OFFLINE:
+            status = UserStatusOffline(was_online=self.now - timedelta(seconds=self.offline_for[idx]))
+        elif code == ST_RECENTLY:
+            status = UserStatusRecently()
+        elif code == ST_LASTWEEK:
+            status = UserStatusLastWeek()
+        elif code == ST_LASTMONTH:
+            status = UserStatusLastMonth()
+        else:
+            status = UserStatusEmpty()
+
+        return User(id=self.user_id(idx), first_name=first, last_name=last, username=username,
+                    bot=bool(self.is_bot[idx]), status=status)
+
+    def search(self, query):
+        """User indices whose first or last name starts with query (ascending, capped)."""
+        q = query.lower()
+        lo = bisect.bisect_left(self.sorted_words, q)
+        lists = []
+        for pos in range(lo, len(self.sorted_words)):
+            if not self.sorted_words[pos].startswith(q):
+                break
+            lists.append(self.postings[self.sorted_vocab[pos]])
+
+        result = []
+        last = -1
+        for idx in heapq.merge(*lists):
+            if idx == last:
+                continue
+            last = idx
+            result.append(idx)
+            if len(result) >= self.search_limit:
+                break
+        return result
+
+    # --- TelegramClient surface ------------------------------------------------
+
+    def is_connected(self):
+        return True
+
+    async def _request(self, search=False):
+        self.requests += 1
+        if search:
+            self.search_requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.flood_rate and self.rng.random() < self.flood_rate:
+            self.flood_waits += 1
+            raise FloodWaitError(request=None, capture=self.flood_seconds)
+
+    async def get_entity(self, entity):
+        await self._request()
+        count = None if self.hide_count else self.size
+        return FakeChannel(self.channel.id, self.channel.title, count)
+
+    async def get_participants(self, entity, limit=None, **kwargs):
+        if limit == 0:
+            await self._request()
+            result = TotalList()
+            result.total = self.size
+            return result
+        return [u async for u in self.iter_participants(entity, limit=limit, **kwargs)]
+
+    async def iter_participants(self, entity, limit=None, search=None, **kwargs):
+        if search:
+            indices = self.search(search)
+        else:
+            indices = range(min(self.size, self.list_limit))
+        if limit is not None:
+            indices = indices[:limit]
+
+        # One request per page, the first one even when the result is empty
+        for start in range(0, max(len(indices), 1), PAGE_SIZE):
+            await self._request(search=bool(search))
+            for idx in indices[start:start + PAGE_SIZE]:
+                self.users_served += 1
+                yield self.make_user(idx)
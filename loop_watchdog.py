@@ -0,0 +1,123 @@
+import asyncio
+import collections
+import os
+import sys
+import threading
+import time
+import traceback
+
+# Opt-in event-loop diagnostics.
+#
+# LoopWatchdog: a heartbeat coroutine ticks every `interval`; a helper thread notices
+# when the tick is late by more than `threshold` and prints the loop thread's stack at
+# that moment, i.e. the callback that is blocking the loop (a sync DB write, a pandas
+# load...). When the loop recovers it prints how long it was blocked.
+#
+# SamplingProfiler: samples the loop thread's stack every few ms from a helper thread
+# and writes collapsed stacks ("a;b;c 42") usable by flamegraph.pl or speedscope.
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+def _collapsed_stack(frame):
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+class LoopWatchdog:
+    def __init__(self, threshold=0.25, interval=0.05, on_block=None):
+        self.threshold = threshold
+        self.interval = interval
+        self.on_block = on_block
+        self.blocks = 0
+        self.worst = 0.0
+        self._last_beat = time.monotonic()
+        self._loop_thread_id = None
+        self._stop = threading.Event()
+
+    async def _heartbeat(self):
+        while not self._stop.is_set():
+            self._last_beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+
+    def _watch(self):
+        reported_beat = None
+        stack = None
+        while not self._stop.wait(self.interval):
+            beat = self._last_beat
+            stalled = time.monotonic() - beat - self.interval
+            if stalled > self.threshold and reported_beat != beat:
+                # Loop is stuck right now: its current stack is the blocking callback
+                frame = sys._current_frames().get(self._loop_thread_id)
+                stack = "".join(traceback.format_stack(frame)) if frame else "(stack unavailable)"
+                reported_beat = beat
+            elif reported_beat is not None and beat != reported_beat:
+                # Loop recovered: report the full block duration once
+                blocked = beat - reported_beat - self.interval
+                self.blocks += 1
+                self.worst = max(self.worst, blocked)
+                print(f"🐢 Event loop blocked for {blocked * 1000:.0f}ms. Stack when detected:\n{stack}")
+                if self.on_block:
+                    self.on_block(blocked, stack)
+                reported_beat = None
+
+    def start(self):
+        """Must be called from the loop thread (inside or before run_until_complete)."""
+        self._loop_thread_id = threading.get_ident()
+        asyncio.get_event_loop().create_task(self._heartbeat())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+class SamplingProfiler:
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.samples = collections.Counter()
+        self.total = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples[_collapsed_stack(frame)] += 1
+                self.total += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def write_collapsed(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+    def top_functions(self, n=10):
+        """[(frame, self_pct)] by samples where the frame was on top of the stack."""
+        leaf = collections.Counter()
+        for stack, count in self.samples.items():
+            leaf[stack.rsplit(";", 1)[-1]] += count
+        return [(name, count / self.total * 100) for name, count in leaf.most_common(n)] if self.total else []
+
+async def profile_loop(seconds, path, interval=0.005):
+    """Profiles the calling loop's thread for `seconds`; writes collapsed stacks to path."""
+    profiler = SamplingProfiler(threading.get_ident(), interval)
+    profiler.start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.stop()
+    profiler.write_collapsed(path)
+    return profiler
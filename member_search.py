@@ -0,0 +1,153 @@
+import argparse
+import re
+import sqlite3
+import sys
+import time
+import unicodedata
+
+from export_members import DB_FILE, SchemaError, open_db, resolve_channel, table_exists
+
+# Full-text member lookup: an FTS5 index over normalized "username first_name last_name",
+# keyed by the members rowid. save_members_batch/save_member keep it current; /find and
+# this CLI query it.
+
+# Arabic and Persian keyboards produce different code points for the same letter
+CHAR_MAP = str.maketrans({
+    'ي': 'ی', 'ى': 'ی', 'ئ': 'ی',
+    'ك': 'ک',
+    'ة': 'ه', 'ۀ': 'ه',
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ؤ': 'و',
+    '\u0640': None,  # tatweel
+    '\u200c': None,  # zero-width non-joiner
+    '\u200d': None,  # zero-width joiner
+    '\u200f': None,  # right-to-left mark
+    **{chr(0x06F0 + i): str(i) for i in range(10)},  # Persian digits
+    **{chr(0x0660 + i): str(i) for i in range(10)},  # Arabic-Indic digits
+})
+
+FTS_TABLE_SQL = "CREATE VIRTUAL TABLE IF NOT EXISTS members_fts USING fts5(name, tokenize='unicode61 remove_diacritics 2')"
+
+def normalize_name(text):
+    """Folds Arabic/Persian letter variants and digits, strips diacritics and joiners, lowercases."""
+    if not text:
+        return ""
+    text = unicodedata.normalize('NFKD', text.translate(CHAR_MAP))
+    # Combining marks: Arabic harakat, Latin accents
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return unicodedata.normalize('NFC', text).translate(CHAR_MAP).lower()
+
+def fts_document(username, first_name, last_name):
+    return " ".join(normalize_name(part) for part in (username, first_name, last_name) if part)
+
+def index_members(conn, keys, changed_at=None):
+    """
+    (Re)indexes members rows for keys [(id, channel_id)]. Caller commits.
+    With changed_at, rows whose updated_at is older are skipped (the upsert only bumps
+    updated_at on a real change, so unchanged members in a rescan cost nothing here).
+    """
+    by_channel = {}
+    for user_id, channel_id in keys:
+        by_channel.setdefault(channel_id, []).append(user_id)
+    rows = []
+    for channel_id, ids in by_channel.items():
+        sql = f"SELECT rowid, username, first_name, last_name FROM members WHERE channel_id = ? AND id IN ({','.join('?' * len(ids))})"
+        params = [channel_id, *ids]
+        if changed_at is not None:
+            sql += " AND updated_at >= ?"
+            params.append(changed_at)
+        rows.extend((rowid, fts_document(u, f, l)) for rowid, u, f, l in conn.execute(sql, params))
+    conn.executemany("INSERT OR REPLACE INTO members_fts (rowid, name) VALUES (?, ?)", rows)
+
+def ensure_index(conn, chunk_size=5000):
+    """Creates members_fts and backfills it from existing rows the first time."""
+    if table_exists(conn, 'members_fts'):
+        return 0
+    conn.execute(FTS_TABLE_SQL)
+    total = 0
+    cursor = conn.execute("SELECT rowid, username, first_name, last_name FROM members")
+    while True:
+        chunk = cursor.fetchmany(chunk_size)
+        if not chunk:
+            break
+        conn.executemany(
+            "INSERT INTO members_fts (rowid, name) VALUES (?, ?)",
+            [(rowid, fts_document(u, f, l)) for rowid, u, f, l in chunk]
+        )
+        total += len(chunk)
+    conn.commit()
+    return total
+
+def build_match(query):
+    """Every word must match as a prefix: 'ali rez' -> "ali"* "rez"*"""
+    words = re.findall(r'\w+', normalize_name(query.lstrip('@')))
+    return " ".join(f'"{w}"*' for w in words)
+
+def search(conn, query, channel_id=None, limit=20):
+    """Returns [(id, username, first_name, last_name, channel_id, status, left_at)] best match first."""
+    match = build_match(query)
+    if not match:
+        return []
+    sql = '''
+        SELECT m.id, m.username, m.first_name, m.last_name, m.channel_id, m.status, m.left_at
+        FROM members_fts JOIN members m ON m.rowid = members_fts.rowid
+        WHERE members_fts MATCH ?
+    '''
+    params = [match]
+    if channel_id is not None:
+        sql += " AND m.channel_id = ?"
+        params.append(channel_id)
+    sql += " ORDER BY members_fts.rank LIMIT ?"
+    params.append(limit)
+    return conn.execute(sql, params).fetchall()
+
+def format_result(row, titles=None):
+    user_id, username, first, last, channel_id, status, left_at = row
+    name = " ".join(part for part in (first, last) if part) or "-"
+    handle = f" @{username}" if username else ""
+    channel = (titles or {}).get(channel_id, channel_id)
+    left = " (left)" if left_at else ""
+    return f"{user_id}{handle} | {name} | {status} | {channel}{left}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search members.db by name or username.")
+    parser.add_argument("query", help="Words to find (prefix match, Arabic/Persian variants folded)")
+    parser.add_argument("--db", default=DB_FILE)
+    parser.add_argument("--channel", help="Only this channel (ID, @username or title)")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    try:
+        conn = open_db(args.db)
+    except (FileNotFoundError, SchemaError) as e:
+        print(f"❌ {e}")
+        return 1
+
+    try:
+        if not table_exists(conn, 'members_fts'):
+            print("❌ No search index yet. Start the bot once to build it.")
+            return 1
+        channel_id = None
+        if args.channel:
+            channel = resolve_channel(conn, args.channel)
+            if not channel:
+                print(f"❌ Channel not found in DB: {args.channel}")
+                return 1
+            channel_id = channel[0]
+        titles = {}
+        if table_exists(conn, 'channels'):
+            titles = dict(conn.execute("SELECT id, title FROM channels"))
+        for row in search(conn, args.query, channel_id, args.limit):
+            print(format_result(row, titles))
+    except sqlite3.OperationalError as e:
+        print(f"❌ {e}")
+        return 1
+    finally:
+        conn.close()
+
+    print(f"✅ Done in {(time.perf_counter() - started) * 1000:.1f}ms")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+import asyncio
+import bisect
+import threading
+import time
+
+# In-process counters and histograms for the scan/DB/export hot paths.
+# Rendered as text for /stats and in Prometheus exposition format for the optional
+# localhost scrape endpoint (METRICS_PORT).
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+COUNT_BUCKETS = (0, 1, 10, 50, 100, 150, 200, 500, 1000, 5000)
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()  # DB/export helpers record from executor threads
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def _label_str(self, key, extra=None):
+        pairs = [f'{label}="{value}"' for label, value in zip(self.labels, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def items(self):
+        with self._lock:
+            return sorted(self._values.items())
+
+    def render(self):
+        return [f"{self.name}{self._label_str(key)} {value}" for key, value in self.items()]
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [per-bucket counts..., +Inf count], sum, count, max
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0, 0.0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+            state[3] = max(state[3], value)
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def summary(self):
+        """{label_key: (count, avg, max)}"""
+        with self._lock:
+            return {key: (s[2], s[1] / s[2] if s[2] else 0.0, s[3]) for key, s in sorted(self._values.items())}
+
+    def render(self):
+        lines = []
+        with self._lock:
+            items = sorted((key, [list(s[0]), s[1], s[2]]) for key, s in self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + ('+Inf',), counts):
+                cumulative += n
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{self._label_str(key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_str(key)} {total}")
+            lines.append(f"{self.name}_count{self._label_str(key)} {count}")
+        return lines
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+REGISTRY = []
+
+def _register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+def counter(name, help_text, labels=()):
+    return _register(Counter(name, help_text, labels))
+
+def gauge(name, help_text, labels=()):
+    return _register(Gauge(name, help_text, labels))
+
+def histogram(name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+    return _register(Histogram(name, help_text, labels, buckets))
+
+def render_prometheus():
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# --- Bot metrics --------------------------------------------------------------
+
+SCAN_REQUESTS = counter("bot_scan_requests_total", "Participant queries issued", ("session",))
+SCAN_QUERY_SECONDS = histogram("bot_scan_query_seconds", "Duration of one participant query", ("session",))
+SCAN_QUERY_USERS = histogram("bot_scan_query_users", "Users returned by one participant query", buckets=COUNT_BUCKETS)
+FLOODWAIT_SECONDS = counter("bot_floodwait_seconds_total", "Seconds requested by FloodWait errors", ("session",))
+DB_BATCH_SECONDS = histogram("bot_db_batch_commit_seconds", "save_members_batch write + commit time")
+EXPORT_SECONDS = histogram("bot_export_seconds", "Export file generation time", ("kind",))
+EXECUTOR_INFLIGHT = gauge("bot_executor_inflight", "Tasks submitted to an executor and not finished (queued + running)", ("pool",))
+EXECUTOR_WAIT_SECONDS = histogram("bot_executor_queue_wait_seconds", "Time a task waited for a free worker", ("pool",))
+LOOP_LAG_SECONDS = histogram("bot_event_loop_lag_seconds", "Event loop scheduling lag",
+                             buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 5))
+LOOP_BLOCKS = counter("bot_event_loop_blocks_total", "Times the loop watchdog saw the loop blocked past its threshold")
+
+async def loop_lag_monitor(interval=1.0):
+    """Samples how late the loop wakes up from a sleep(interval)."""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG_SECONDS.observe(max(loop.time() - started - interval, 0.0))
+
+async def _handle_http(reader, writer):
+    try:
+        request_line = await reader.readline()
+        # Drain headers
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        path = request_line.split()[1].decode() if len(request_line.split()) > 1 else "/"
+        if path.startswith("/metrics"):
+            body = render_prometheus().encode()
+            status = "200 OK"
+        else:
+            body = b"not found\n"
+            status = "404 Not Found"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except Exception:
+        pass
+    finally:
+        writer.close()
+
+async def start_http_server(port, host="127.0.0.1"):
+    """Serves GET /metrics in Prometheus text format. Binds to localhost by default."""
+    return await asyncio.start_server(_handle_http, host, port)
+
+def timed_process_call(submitted, func, *args):
+    """Runs in an export worker process: returns (queue wait, func(*args)). submitted is the
+    parent's time.time(); the parent records the wait, since this process's metrics are never rendered."""
+    return time.time() - submitted, func(*args)
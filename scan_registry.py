@@ -0,0 +1,192 @@
+import asyncio
+import collections
+import contextlib
+import time
+
+# Registry of channel scans in this process, behind /scans, /pause, /resume, /cancel and
+# /priority. Every participant request of every scan takes a slot from one shared
+# RequestBudget, so concurrency is bounded across channels instead of per scan. Free slots
+# go to the highest-priority scan, and among equal priorities to the one with the fewest
+# requests in flight, so one big scan can't queue ahead of the rest. A paused scan gets no
+# new slots, which leaves the whole budget to the other scans.
+
+class RequestBudget:
+    def __init__(self, slots):
+        self.slots = slots
+        self.in_use = 0
+        self._queues = {}  # ScanJob -> deque of waiting futures
+
+    async def acquire(self, job):
+        fut = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(job, collections.deque()).append(fut)
+        self.grant()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # Granted right as we were cancelled: hand the slot on
+                self.release(job)
+            else:
+                queue = self._queues.get(job)
+                if queue and fut in queue:
+                    queue.remove(fut)
+            raise
+
+    def release(self, job):
+        self.in_use -= 1
+        job.in_flight -= 1
+        self.grant()
+
+    def grant(self):
+        """Hands free slots to waiting requests of running (not paused) scans."""
+        while self.in_use < self.slots:
+            ready = [job for job, queue in self._queues.items() if queue and job.state == 'running']
+            if not ready:
+                return
+            job = min(ready, key=lambda j: (-j.priority, j.in_flight))
+            queue = self._queues[job]
+            fut = queue.popleft()
+            if not queue:
+                del self._queues[job]
+            if fut.done():
+                continue  # cancelled while waiting
+            self.in_use += 1
+            job.in_flight += 1
+            fut.set_result(None)
+
+    @property
+    def waiting(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+class ScanJob:
+    def __init__(self, channel_id, title, username=None, session=None, priority=0, task=None):
+        self.channel_id = channel_id
+        self.title = title
+        self.username = username
+        self.session = session
+        self.priority = priority
+        self.task = task
+        self.state = 'running'  # running, paused, done, failed, cancelled
+        self.phase = ''
+        self.found = 0
+        self.total = 0
+        self.requests = 0
+        self.in_flight = 0
+        self.request_seconds = 0.0
+        self.floodwait_seconds = 0
+        self.started_at = time.time()
+        self.finished_at = None
+
+    @property
+    def active(self):
+        return self.state in ('running', 'paused')
+
+class ScanRegistry:
+    def __init__(self, budget):
+        self.budget = budget
+        self.jobs = {}  # channel_id -> latest ScanJob
+
+    def start(self, channel_id, title, username=None, session=None, task=None, priority=None):
+        """Registers a scan, replacing the channel's previous job in the listing."""
+        job = ScanJob(channel_id, title, username, session, priority or 0, task)
+        self.jobs[channel_id] = job
+        return job
+
+    def finish(self, job, state):
+        job.state = state
+        job.finished_at = time.time()
+
+    @contextlib.asynccontextmanager
+    async def request(self, job):
+        """One participant request: waits for a budget slot (none are granted while the scan is paused)."""
+        await self.budget.acquire(job)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            job.requests += 1
+            job.request_seconds += time.perf_counter() - started
+            self.budget.release(job)
+
+    async def pages(self, job, iterator, page_size):
+        """Yields (page, slot wait) from a participant iterator, one budget slot per page.
+
+        Telethon fetches page_size users per request and hands them out one by one, so the
+        slot is held only while a page is pulled; the caller processes it without the slot and
+        a pause takes effect before the next page. Errors (FloodWait) propagate after the
+        already fetched users, with the slot released.
+        """
+        iterator = iterator.__aiter__()
+        while True:
+            page = []
+            error = None
+            exhausted = False
+            wait_t0 = time.perf_counter()
+            async with self.request(job):
+                waited = time.perf_counter() - wait_t0
+                try:
+                    while len(page) < page_size:
+                        page.append(await iterator.__anext__())
+                except StopAsyncIteration:
+                    exhausted = True
+                except Exception as e:
+                    error = e
+            if page:
+                yield page, waited
+            if error:
+                raise error
+            if exhausted:
+                return
+
+    def find(self, selector):
+        """Latest job for a channel ID, -100 ID, @username or title (case-insensitive prefix)."""
+        selector = selector.strip()
+        digits = selector[4:] if selector.startswith("-100") else selector.lstrip('-')
+        name = selector.lstrip('@').lower()
+        for job in self.jobs.values():
+            if digits.isdigit() and job.channel_id == int(digits):
+                return job
+        for job in self.jobs.values():
+            if (job.username or "").lower() == name or job.title.lower().startswith(selector.lower()):
+                return job
+        return None
+
+    def pause(self, job):
+        if job.state != 'running':
+            return False
+        job.state = 'paused'
+        return True
+
+    def resume(self, job):
+        if job.state != 'paused':
+            return False
+        job.state = 'running'
+        self.budget.grant()
+        return True
+
+    def cancel(self, job):
+        if not job.active or not job.task:
+            return False
+        job.task.cancel()
+        return True
+
+    def listing(self):
+        """Active scans by priority, then the finished ones, newest first."""
+        active = sorted((j for j in self.jobs.values() if j.active), key=lambda j: (-j.priority, j.started_at))
+        finished = sorted((j for j in self.jobs.values() if not j.active), key=lambda j: -j.finished_at)
+        return active + finished
+
+STATE_ICONS = {'running': '▶️', 'paused': '⏸', 'done': '✅', 'failed': '❌', 'cancelled': '⏹'}
+
+def format_job(job):
+    elapsed = int((job.finished_at or time.time()) - job.started_at)
+    pct = f" ({min(job.found / job.total * 100, 100):.1f}%)" if job.total else ""
+    avg = f", avg {job.request_seconds / job.requests:.2f}s" if job.requests else ""
+    flood = f", FloodWait {job.floodwait_seconds}s" if job.floodwait_seconds else ""
+    lines = [
+        f"{STATE_ICONS.get(job.state, '•')} **{job.title}** `{job.channel_id}` P{job.priority}",
+        f"   👥 {job.found}/{job.total}{pct} | 📡 {job.requests} req{avg}{flood} | ⏱ {elapsed // 60}m{elapsed % 60:02d}s",
+    ]
+    if job.active and job.phase:
+        lines.append(f"   📌 {job.phase} ({job.session})")
+    return "\n".join(lines)
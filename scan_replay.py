@@ -0,0 +1,167 @@
+import asyncio
+import gzip
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+
+from telethon.helpers import TotalList
+from telethon.tl.types import User, UserStatusOnline, UserStatusOffline, UserStatusRecently, UserStatusLastWeek, UserStatusLastMonth, UserStatusEmpty
+
+from fake_telegram import PAGE_SIZE, FakeChannel, FakeSession, ST_ONLINE, ST_OFFLINE, ST_RECENTLY, ST_LASTWEEK, ST_LASTMONTH, ST_EMPTY
+
+# Record-and-replay for participant searches. RecordingClient wraps a live client and
+# appends every iter_participants() result to a gzip JSONL fixture; ReplayClient serves
+# the fixture back deterministically so scan coverage and request counts can be
+# regression-tested offline against real-world-shaped data.
+#
+# Fixture lines:
+#   {"channel": id, "title": str, "participants_count": n}        (header, once)
+#   {"q": query, "u": [[user_id, status_code, age_seconds], ...]}  (one per query, "" = no search)
+# age_seconds is how long before recording an offline user was last seen, so replayed
+# users classify into the same tiers no matter when the fixture is replayed.
+
+def encode_status(status, now):
+    if isinstance(status, UserStatusOnline):
+        return ST_ONLINE, 0
+    if isinstance(status, UserStatusOffline):
+        was_online = status.was_online
+        if was_online.tzinfo is None:
+            was_online = was_online.replace(tzinfo=timezone.utc)
+        return ST_OFFLINE, max(int((now - was_online).total_seconds()), 0)
+    if isinstance(status, UserStatusRecently):
+        return ST_RECENTLY, 0
+    if isinstance(status, UserStatusLastWeek):
+        return ST_LASTWEEK, 0
+    if isinstance(status, UserStatusLastMonth):
+        return ST_LASTMONTH, 0
+    return ST_EMPTY, 0
+
+def decode_status(code, age, now):
+    if code == ST_ONLINE:
+        return UserStatusOnline(expires=now + timedelta(minutes=5))
+    if code == ST_OFFLINE:
+        return UserStatusOffline(was_online=now - timedelta(seconds=age))
+    if code == ST_RECENTLY:
+        return UserStatusRecently()
+    if code == ST_LASTWEEK:
+        return UserStatusLastWeek()
+    if code == ST_LASTMONTH:
+        return UserStatusLastMonth()
+    return UserStatusEmpty()
+
+# One writer thread for every recording: appends stay in order and the gzip open/write
+# never runs on the event loop. Pending writes are flushed when the process exits.
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scan-record")
+
+def fixture_path(record_dir, channel_id):
+    return os.path.join(record_dir, f"{channel_id}.jsonl.gz")
+
+class RecordingClient:
+    """Wraps a TelegramClient and records participant queries; everything else passes through."""
+
+    def __init__(self, client, path):
+        self._client = client
+        self._path = path
+        self._header_written = os.path.exists(path)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def _append(self, record):
+        _writer.submit(self._write, record)
+
+    def _write(self, record):
+        # gzip members can be concatenated, so appending keeps partial recordings usable
+        with gzip.open(self._path, 'at', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+            f.write("\n")
+
+    async def get_entity(self, entity):
+        result = await self._client.get_entity(entity)
+        if not self._header_written and hasattr(result, 'participants_count'):
+            self._append({'channel': result.id, 'title': getattr(result, 'title', ''),
+                          'participants_count': result.participants_count})
+            self._header_written = True
+        return result
+
+    async def iter_participants(self, entity, limit=None, search=None, **kwargs):
+        now = datetime.now(timezone.utc)
+        users = []
+        try:
+            async for user in self._client.iter_participants(entity, limit=limit, search=search, **kwargs):
+                code, age = encode_status(user.status, now)
+                users.append([user.id, code, age])
+                yield user
+        finally:
+            # Record whatever was served, even if the query was cut short by an error
+            self._append({'q': search or "", 'u': users})
+
+class ReplayClient:
+    """Serves a recorded fixture. Unknown queries return no users (and are counted)."""
+
+    def __init__(self, path, latency=0.0):
+        self.latency = latency
+        self.session = FakeSession(os.path.basename(path))
+        self.queries = {}
+        self.channel = None
+        participants_count = None
+
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                if 'channel' in record:
+                    self.channel = FakeChannel(record['channel'], record.get('title', ''), record.get('participants_count'))
+                    participants_count = record.get('participants_count')
+                else:
+                    # Keep the first recording of a query (smart_tiered repeats queries per phase)
+                    self.queries.setdefault(record['q'], record['u'])
+
+        if self.channel is None:
+            raise ValueError(f"{path} has no channel header")
+        self.participants_count = participants_count or len({u[0] for users in self.queries.values() for u in users})
+        self.recorded_users = len({u[0] for users in self.queries.values() for u in users})
+
+        # Request accounting, same fields as FakeTelegramClient
+        self.requests = 0
+        self.search_requests = 0
+        self.flood_waits = 0
+        self.users_served = 0
+        self.missing_queries = set()
+
+    def is_connected(self):
+        return True
+
+    async def _request(self, search=False):
+        self.requests += 1
+        if search:
+            self.search_requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def get_entity(self, entity):
+        await self._request()
+        return FakeChannel(self.channel.id, self.channel.title, self.participants_count)
+
+    async def get_participants(self, entity, limit=None, **kwargs):
+        if limit == 0:
+            await self._request()
+            result = TotalList()
+            result.total = self.participants_count
+            return result
+        return [u async for u in self.iter_participants(entity, limit=limit, **kwargs)]
+
+    async def iter_participants(self, entity, limit=None, search=None, **kwargs):
+        key = search or ""
+        if key not in self.queries:
+            self.missing_queries.add(key)
+        users = self.queries.get(key, [])
+        if limit is not None:
+            users = users[:limit]
+
+        now = datetime.now(timezone.utc)
+        for start in range(0, max(len(users), 1), PAGE_SIZE):
+            await self._request(search=bool(search))
+            for user_id, code, age in users[start:start + PAGE_SIZE]:
+                self.users_served += 1
+                yield User(id=user_id, status=decode_status(code, age, now))
@@ -0,0 +1,38 @@
+import json
+import logging
+import logging.handlers
+import os
+import time
+
+# Optional per-query tracing for recursive_scan_task. Each span is one JSON line:
+#   {"ts", "kind": "query", "channel", "prefix", "depth", "phase", "duration",
+#    "results", "new_users", "sem_wait", "recursed", "error"}
+#   {"ts", "kind": "phase", "channel", "phase", "duration", "queries", "new_users"}
+# Files rotate like logging's RotatingFileHandler (scan.jsonl, scan.jsonl.1, ...).
+# Summarize with analyze_trace.py.
+
+class ScanTracer:
+    def __init__(self, path, max_bytes=50 * 1024 * 1024, backups=5):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._logger = logging.getLogger(f"scan_trace.{path}")
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+        if not self._logger.handlers:
+            handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._logger.addHandler(handler)
+
+    def span(self, kind, **fields):
+        fields = {'ts': round(time.time(), 3), 'kind': kind, **fields}
+        self._logger.info(json.dumps(fields, ensure_ascii=False, separators=(',', ':')))
+
+def tracer_from_env():
+    """Returns a ScanTracer when SCAN_TRACE_FILE is set, else None."""
+    path = os.getenv("SCAN_TRACE_FILE")
+    if not path:
+        return None
+    max_mb = float(os.getenv("SCAN_TRACE_MAX_MB", "50"))
+    return ScanTracer(path, max_bytes=int(max_mb * 1024 * 1024))
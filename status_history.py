@@ -0,0 +1,93 @@
+import time
+
+from export_members import STATUS_LABELS, FILTER_STATUSES, table_exists
+
+# Run-length status history per (channel, user): one row per run of consecutive days on
+# which the member was observed with the same status (by a scan or a join event).
+# Observing an unchanged status the day after end_day extends the open run, and a second
+# observation on the same day writes nothing, so members whose status doesn't change cost
+# one row as long as they are seen daily. After days without an observation a new run
+# starts, so unobserved days never count as active.
+# Status is stored as its index in STATUS_LABELS; days are unix days (UTC).
+
+HISTORY_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS status_history (
+        channel_id INTEGER,
+        user_id INTEGER,
+        start_day INTEGER,
+        end_day INTEGER,
+        status INTEGER,
+        PRIMARY KEY (channel_id, user_id, start_day)
+    ) WITHOUT ROWID
+'''
+
+# Statuses that count as "active" on the day they were observed
+ACTIVE_CODES = [STATUS_LABELS.index(label) for label in FILTER_STATUSES['recently']]
+
+def today(now=None):
+    return int((now or time.time()) // 86400)
+
+def ensure_table(conn):
+    conn.execute(HISTORY_TABLE_SQL)
+
+def record(conn, observations, day):
+    """observations: {(user_id, channel_id): status_label} seen on `day`. Caller commits."""
+    by_channel = {}
+    for (user_id, channel_id), label in observations.items():
+        by_channel.setdefault(channel_id, {})[user_id] = STATUS_LABELS.index(label) if label in STATUS_LABELS else len(STATUS_LABELS) - 1
+
+    inserts, extends, truncates = [], [], []
+    for channel_id, codes in by_channel.items():
+        ids = list(codes)
+        # Latest run per user (primary-key lookups)
+        last_runs = conn.execute(f'''
+            SELECT user_id, start_day, end_day, status FROM status_history h
+            WHERE channel_id = ? AND user_id IN ({','.join('?' * len(ids))})
+              AND start_day = (SELECT MAX(start_day) FROM status_history
+                               WHERE channel_id = h.channel_id AND user_id = h.user_id)
+        ''', [channel_id, *ids])
+        last = {user_id: (start, end, status) for user_id, start, end, status in last_runs}
+
+        for user_id, code in codes.items():
+            run = last.get(user_id)
+            if run is None or run[1] < day - 1 or run[1] < day and run[2] != code:
+                inserts.append((channel_id, user_id, day, day, code))
+            elif run[2] == code:
+                if run[1] < day:
+                    extends.append((day, channel_id, user_id, run[0]))
+            elif run[0] == day:
+                # Status changed again on the run's first day: keep the latest observation
+                truncates.append((code, channel_id, user_id, run[0]))
+            else:
+                # Changed on a day already covered by the open run: close it yesterday
+                extends.append((day - 1, channel_id, user_id, run[0]))
+                inserts.append((channel_id, user_id, day, day, code))
+
+    conn.executemany("UPDATE status_history SET end_day = ? WHERE channel_id = ? AND user_id = ? AND start_day = ?", extends)
+    conn.executemany("UPDATE status_history SET status = ? WHERE channel_id = ? AND user_id = ? AND start_day = ?", truncates)
+    conn.executemany("INSERT OR REPLACE INTO status_history (channel_id, user_id, start_day, end_day, status) VALUES (?, ?, ?, ?, ?)", inserts)
+
+def active_days_sql(window=30):
+    """
+    Subquery selecting user_id of members active on at least ? of the last `window` days
+    in channel ?. Parameters, in order: channel_id, min_days. Day bounds are inlined.
+    """
+    last = today()
+    first = last - window + 1
+    codes = ",".join(str(code) for code in ACTIVE_CODES)
+    return f'''
+        SELECT user_id FROM status_history
+        WHERE channel_id = ? AND status IN ({codes}) AND end_day >= {first}
+        GROUP BY user_id
+        HAVING SUM(MIN(end_day, {last}) - MAX(start_day, {first}) + 1) >= ?
+    '''
+
+def member_history(conn, channel_id, user_id):
+    """[(start_day, end_day, status_label)] oldest first."""
+    if not table_exists(conn, 'status_history'):
+        return []
+    rows = conn.execute(
+        "SELECT start_day, end_day, status FROM status_history WHERE channel_id = ? AND user_id = ? ORDER BY start_day",
+        (channel_id, user_id)
+    )
+    return [(start, end, STATUS_LABELS[status]) for start, end, status in rows]
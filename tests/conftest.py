@@ -0,0 +1,29 @@
+import contextlib
+import io
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+@pytest.fixture(scope="session")
+def bot_module(tmp_path_factory):
+    # bot.py needs credentials at import time and creates a session in the CWD (see bench_scan.py)
+    os.environ.setdefault("API_ID", "1")
+    os.environ.setdefault("API_HASH", "test")
+    os.chdir(tmp_path_factory.mktemp("bot"))
+    with contextlib.redirect_stdout(io.StringIO()):
+        import bot
+    return bot
+
+@pytest.fixture
+def bot(bot_module, tmp_path, monkeypatch):
+    """bot with a fresh DB and export cache in tmp_path."""
+    monkeypatch.setattr(bot_module, "DB_FILE", str(tmp_path / "members.db"))
+    monkeypatch.setattr(bot_module, "EXPORT_CACHE_DIR", str(tmp_path / "export_cache"))
+    monkeypatch.chdir(tmp_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        bot_module.init_db()
+    return bot_module
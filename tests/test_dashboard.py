@@ -0,0 +1,21 @@
+import asyncio
+import sqlite3
+import time
+
+class Channel:
+    id = 77
+    title = "Chan"
+
+def test_dashboard_shows_prefetched_stats(bot):
+    now = int(time.time())
+    conn = sqlite3.connect(bot.DB_FILE)
+    bot.write_member_rows(conn, [(i, f"u{i}", "a", "b", "", 0, 77, 'week', now, now, None, None, None) for i in range(3)], now)
+    conn.commit()
+    conn.close()
+
+    stats = asyncio.run(bot.fetch_dashboard_stats(77))
+    menu = bot.generate_dashboard_menu(Channel(), "✅ Indexed", True, True, stats)
+
+    assert stats is not None
+    assert bot.format_tier_counts(stats) in menu
+    assert bot.format_tier_counts(stats) not in bot.generate_dashboard_menu(Channel(), "✅ Indexed", True, True)
@@ -0,0 +1,25 @@
+import asyncio
+import contextlib
+import io
+import sqlite3
+
+from fake_telegram import FakeTelegramClient
+
+def test_finished_scan_pregenerates_exports(bot, monkeypatch):
+    monkeypatch.setattr(bot, "EXPORT_PREGENERATE", True)
+    fake = FakeTelegramClient(size=2000, names='latin', channel_id=4242)
+
+    async def scan():
+        await bot.recursive_scan_task(fake.channel, scan_client=fake)
+        # pregenerate_exports runs as a background task started by the scan
+        pending = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        await asyncio.gather(*pending)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        asyncio.run(scan())
+
+    conn = sqlite3.connect(bot.DB_FILE)
+    modes = {row[0] for row in conn.execute("SELECT mode FROM export_artifacts WHERE channel_id = ?", (4242,))}
+    conn.close()
+    assert modes == set(bot.EXPORT_MODES)
+    assert bot.get_cached_exports(4242, bot.EXPORT_MODES) is not None
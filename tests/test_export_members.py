@@ -0,0 +1,20 @@
+import sqlite3
+
+from openpyxl import load_workbook
+
+import export_members
+
+def test_write_xlsx_splits_sheets_at_the_row_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_members, "XLSX_MAX_SHEET_ROWS", 3)
+    conn = sqlite3.connect(":memory:")
+    conn.execute(f"CREATE TABLE members ({', '.join(export_members.EXPORT_COLUMNS)})")
+    conn.executemany("INSERT INTO members (id, username, is_bot) VALUES (?, ?, 0)", [(i, f"u{i}") for i in range(7)])
+    path = str(tmp_path / "members.xlsx")
+
+    count = export_members.write_xlsx(conn.execute(f"SELECT {', '.join(export_members.EXPORT_COLUMNS)} FROM members"), path)
+
+    wb = load_workbook(path, read_only=True)
+    assert count == 7
+    assert wb.sheetnames == ["Members", "Members 2", "Members 3"]
+    assert [len(list(ws.iter_rows())) for ws in wb.worksheets] == [4, 4, 2]
+    assert [row[0] for row in wb["Members 3"].iter_rows(min_row=2, values_only=True)] == [6]
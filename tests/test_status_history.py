@@ -0,0 +1,31 @@
+import sqlite3
+
+import pytest
+
+import status_history
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    status_history.ensure_table(conn)
+    return conn
+
+def active(conn, min_days):
+    return {row[0] for row in conn.execute(status_history.active_days_sql(), (1, min_days))}
+
+def test_unobserved_days_are_not_active(conn):
+    today = status_history.today()
+    status_history.record(conn, {(7, 1): 'online'}, today - 29)
+    status_history.record(conn, {(7, 1): 'online'}, today)
+
+    assert status_history.member_history(conn, 1, 7) == [(today - 29, today - 29, 'online'), (today, today, 'online')]
+    assert active(conn, 2) == {7}
+    assert active(conn, 3) == set()
+
+def test_consecutive_days_extend_the_run(conn):
+    today = status_history.today()
+    for day in range(today - 4, today + 1):
+        status_history.record(conn, {(7, 1): 'recently'}, day)
+
+    assert status_history.member_history(conn, 1, 7) == [(today - 4, today, 'recently')]
+    assert active(conn, 5) == {7}
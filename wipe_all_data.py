@@ -1,5 +1,6 @@
 import sqlite3
 import os
+import shutil
 
 DB_FILE = "members.db"
 
@@ -13,6 +14,12 @@ def main():
     c = conn.cursor()
 
     tables = ["members", "scan_checkpoints", "channel_prefs"]
+    # Derived from members (or scan history): left behind they would point at reused rowids
+    # or keep counting wiped members, and the bot only builds them when they don't exist
+    tables += [
+        "members_fts", "channel_overlap", "channel_stats", "status_history",
+        "scan_generations", "scan_queue", "export_watermarks", "export_artifacts",
+    ]
     
     try:
         for table in tables:
@@ -26,6 +33,11 @@ def main():
                 print(f"⚠️ Table '{table}' does not exist.")
 
         conn.commit()
+
+        # Pre-generated export files listed in export_artifacts
+        if os.path.isdir("export_cache"):
+            shutil.rmtree("export_cache", ignore_errors=True)
+            print("Deleted export_cache/.")
         
         print("Running VACUUM...")
         c.execute("VACUUM")